@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from chgnet.graph.converter import CrystalGraphConverter
+from chgnet.graph.converter import CrystalGraphConverter, radius_graph_pbc_torch
 from chgnet.graph.crystalgraph import CrystalGraph
 
-__all__ = ["CrystalGraph", "CrystalGraphConverter"]
+__all__ = ["CrystalGraph", "CrystalGraphConverter", "radius_graph_pbc_torch"]
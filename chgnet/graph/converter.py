@@ -7,6 +7,7 @@ from typing import TYPE_CHECKING, Literal
 
 import numpy as np
 import torch
+from pymatgen.optimization.neighbors import find_points_in_spheres
 from torch import nn
 
 from chgnet.graph.crystalgraph import CrystalGraph
@@ -23,6 +24,61 @@ except (ImportError, AttributeError):
 datatype = torch.float32
 
 
+def radius_graph_pbc_torch(
+    positions: torch.Tensor,
+    cell: torch.Tensor,
+    cutoff: float,
+    pbc: np.ndarray | bool = True,
+) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]:
+    """Find all neighbor pairs within cutoff with torch on the device of positions.
+
+    All periodic images of the cell that can hold a neighbor are enumerated and
+    the distances to every image of every atom are computed with torch.cdist,
+    so the memory grows with n_atoms**2 times the number of images. This suits
+    small systems, where it avoids the neighbor search on the host.
+
+    Args:
+        positions (Tensor): cartesian coordinates of the atoms [n_atoms, 3]
+        cell (Tensor): lattice matrix with lattice vectors as rows [3, 3]
+        cutoff (float): the neighbor search radius.
+        pbc (np.ndarray | bool): periodic boundary conditions along each
+            lattice vector.
+            Default = True
+
+    Returns:
+        tuple[Tensor, ...]: center_index, neighbor_index, image and distance of
+            each pair within cutoff, excluding self pairs, sorted by center_index
+    """
+    n_atoms = len(positions)
+    pbc = torch.as_tensor(np.broadcast_to(pbc, 3).copy(), device=positions.device)
+
+    # wrap the atoms into the cell, so a few images around it hold all neighbors
+    frac_coords = torch.linalg.solve(cell.T, positions.T).T
+    wrap = torch.where(pbc, torch.floor(frac_coords), 0)
+    wrapped = positions - wrap @ cell
+
+    # number of images along each lattice vector from the spacing of its planes
+    plane_spacing = 1 / torch.linalg.norm(torch.linalg.inv(cell), dim=0)
+    n_images = torch.where(pbc, torch.floor(cutoff / plane_spacing) + 1, 0)
+    images = torch.cartesian_prod(
+        *(
+            torch.arange(-n, n + 1, device=positions.device, dtype=positions.dtype)
+            for n in n_images.int().tolist()
+        )
+    ).view(-1, 3)
+
+    shifted = (wrapped[None] + (images @ cell)[:, None]).view(-1, 3)
+    distance = torch.cdist(
+        wrapped, shifted, compute_mode="donot_use_mm_for_euclid_dist"
+    )
+    within = (distance < cutoff) & (distance > 1e-8)
+    center_index, flat_index = within.nonzero(as_tuple=True)
+    neighbor_index = flat_index % n_atoms
+    # images w.r.t. the unwrapped positions
+    image = images[flat_index // n_atoms] + wrap[center_index] - wrap[neighbor_index]
+    return center_index, neighbor_index, image, distance[center_index, flat_index]
+
+
 class CrystalGraphConverter(nn.Module):
     """Convert a pymatgen.core.Structure to a CrystalGraph
     The CrystalGraph dataclass stores essential field to make sure that
@@ -113,7 +169,6 @@ class CrystalGraphConverter(nn.Module):
         Return:
             CrystalGraph that is ready to use by CHGNet
         """
-        n_atoms = len(structure)
         atomic_number = torch.tensor(
             [site.specie.Z for site in structure],
             dtype=torch.int32,
@@ -128,6 +183,143 @@ class CrystalGraphConverter(nn.Module):
         center_index, neighbor_index, image, distance = structure.get_neighbor_list(
             r=self.atom_graph_cutoff, sites=structure.sites, numerical_tol=1e-8
         )
+        return self._build_crystal_graph(
+            atomic_number=atomic_number,
+            atom_frac_coord=atom_frac_coord,
+            lattice=lattice,
+            neighbor_list=(center_index, neighbor_index, image, distance),
+            graph_id=graph_id,
+            mp_id=mp_id,
+            composition=structure.composition.formula,
+            structure=structure,
+        )
+
+    def convert_arrays(
+        self,
+        atomic_numbers: np.ndarray,
+        cart_coords: np.ndarray,
+        lattice: np.ndarray,
+        pbc: np.ndarray | bool = True,
+        graph_id=None,
+        mp_id=None,
+        composition: str | None = None,
+        device: str | torch.device | None = None,
+        neighbor_list: tuple[np.ndarray, ...] | None = None,
+    ) -> CrystalGraph:
+        """Convert raw crystal arrays, return a CrystalGraph.
+
+        This skips building a pymatgen Structure, which is useful when the
+        same system is converted many times (e.g. in MD or relaxations driven
+        by ASE Atoms).
+
+        Args:
+            atomic_numbers (np.ndarray | Tensor): atomic numbers of the atoms
+                [n_atoms]. A tensor already on device is used without a copy.
+            cart_coords (np.ndarray): cartesian coordinates of the atoms [n_atoms, 3]
+            lattice (np.ndarray): lattice matrix with lattice vectors as rows [3, 3]
+            pbc (np.ndarray | bool): periodic boundary conditions along each
+                lattice vector. Default = True
+            graph_id (str): an id to keep track of this crystal graph
+                Default = None
+            mp_id (str): Materials Project id of this structure
+                Default = None
+            composition (str): chemical formula of the crystal
+                Default = None
+            device (str | torch.device): device to create the graph tensors on.
+                Default = None
+            neighbor_list (tuple[np.ndarray, ...]): precomputed (center_index,
+                neighbor_index, image, distance) of all pairs within
+                atom_graph_cutoff, excluding self pairs. If None, the neighbors
+                are searched here.
+                Default = None
+
+        Return:
+            CrystalGraph that is ready to use by CHGNet
+        """
+        cart_coords = np.ascontiguousarray(cart_coords, dtype=float)
+        lattice = np.ascontiguousarray(lattice, dtype=float)
+        if neighbor_list is None:
+            neighbor_list = self.find_neighbors(
+                cart_coords, lattice, pbc, cutoff=self.atom_graph_cutoff
+            )
+        frac_coords = np.linalg.solve(lattice.T, cart_coords.T).T
+        return self._build_crystal_graph(
+            atomic_number=torch.as_tensor(
+                atomic_numbers, dtype=torch.int32, device=device
+            ),
+            atom_frac_coord=torch.tensor(
+                frac_coords, dtype=datatype, device=device, requires_grad=True
+            ),
+            lattice=torch.tensor(
+                lattice, dtype=datatype, device=device, requires_grad=True
+            ),
+            neighbor_list=neighbor_list,
+            graph_id=graph_id,
+            mp_id=mp_id,
+            composition=composition,
+            device=device,
+        )
+
+    @staticmethod
+    def find_neighbors(
+        cart_coords: np.ndarray,
+        lattice: np.ndarray,
+        pbc: np.ndarray | bool,
+        cutoff: float,
+    ) -> tuple[np.ndarray, ...]:
+        """Find all neighbor pairs within cutoff, excluding self pairs.
+
+        Args:
+            cart_coords (np.ndarray): cartesian coordinates of the atoms [n_atoms, 3]
+            lattice (np.ndarray): lattice matrix with lattice vectors as rows [3, 3]
+            pbc (np.ndarray | bool): periodic boundary conditions along each
+                lattice vector.
+            cutoff (float): the neighbor search radius.
+
+        Returns:
+            tuple[np.ndarray, ...]: center_index, neighbor_index, image and
+                distance of each pair
+        """
+        cart_coords = np.ascontiguousarray(cart_coords, dtype=float)
+        center_index, neighbor_index, image, distance = find_points_in_spheres(
+            cart_coords,
+            cart_coords,
+            r=float(cutoff),
+            pbc=np.ascontiguousarray(np.broadcast_to(pbc, 3), dtype=int),
+            lattice=np.ascontiguousarray(lattice, dtype=float),
+            tol=1e-8,
+        )
+        not_self_pair = (center_index != neighbor_index) | (distance > 1e-8)
+        return (
+            center_index[not_self_pair],
+            neighbor_index[not_self_pair],
+            image[not_self_pair],
+            distance[not_self_pair],
+        )
+
+    def _build_crystal_graph(
+        self,
+        atomic_number: torch.Tensor,
+        atom_frac_coord: torch.Tensor,
+        lattice: torch.Tensor,
+        neighbor_list: tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray],
+        graph_id=None,
+        mp_id=None,
+        composition: str | None = None,
+        structure: Structure | None = None,
+        device: str | torch.device | None = None,
+    ) -> CrystalGraph:
+        """Create the atom and bond graphs from a neighbor list and wrap
+        everything into a CrystalGraph.
+        """
+        n_atoms = len(atomic_number)
+        center_index, neighbor_index, image, distance = neighbor_list
+        if np.any(np.diff(center_index) < 0):
+            # directed bonds are sorted by center atom for segment reduction
+            order = np.argsort(center_index, kind="stable")
+            center_index, neighbor_index, image, distance = (
+                arr[order] for arr in neighbor_list
+            )
 
         # Make Graph
         graph = self.create_graph(
@@ -136,8 +328,10 @@ class CrystalGraphConverter(nn.Module):
 
         # Atom Graph
         atom_graph, directed2undirected = graph.adjacency_list()
-        atom_graph = torch.tensor(atom_graph, dtype=torch.int32)
-        directed2undirected = torch.tensor(directed2undirected, dtype=torch.int32)
+        atom_graph = torch.tensor(atom_graph, dtype=torch.int32, device=device)
+        directed2undirected = torch.tensor(
+            directed2undirected, dtype=torch.int32, device=device
+        )
 
         # Bond Graph
         try:
@@ -147,12 +341,15 @@ class CrystalGraphConverter(nn.Module):
         except Exception as exc:
             # Report structures that failed creating bond graph
             # This happen occasionally with pymatgen version issue
-            structure.to(filename="bond_graph_error.cif")
+            if structure is not None:
+                structure.to(filename="bond_graph_error.cif")
             raise SystemExit(
                 f"Failed creating bond graph for {graph_id}, check bond_graph_error.cif"
             ) from exc
-        bond_graph = torch.tensor(bond_graph, dtype=torch.int32)
-        undirected2directed = torch.tensor(undirected2directed, dtype=torch.int32)
+        bond_graph = torch.tensor(bond_graph, dtype=torch.int32, device=device)
+        undirected2directed = torch.tensor(
+            undirected2directed, dtype=torch.int32, device=device
+        )
 
         # Check if graph has isolated atom
         n_isolated_atoms = len({*range(n_atoms)} - {*center_index})
@@ -173,14 +370,14 @@ class CrystalGraphConverter(nn.Module):
             atomic_number=atomic_number,
             atom_frac_coord=atom_frac_coord,
             atom_graph=atom_graph,
-            neighbor_image=torch.tensor(image, dtype=datatype),
+            neighbor_image=torch.tensor(image, dtype=datatype, device=device),
             directed2undirected=directed2undirected,
             undirected2directed=undirected2directed,
             bond_graph=bond_graph,
             lattice=lattice,
             graph_id=graph_id,
             mp_id=mp_id,
-            composition=structure.composition.formula,
+            composition=composition,
             atom_graph_cutoff=self.atom_graph_cutoff,
             bond_graph_cutoff=self.bond_graph_cutoff,
         )
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import math
+
 import numpy as np
 import torch
 from torch import Tensor, nn
@@ -19,6 +21,7 @@ class Fourier(nn.Module):
         """
         super().__init__()
         self.order = order
+        self.learnable = learnable
         # Initialize frequencies at canonical
         if learnable:
             self.frequencies = torch.nn.Parameter(
@@ -33,11 +36,38 @@ class Fourier(nn.Module):
     def forward(self, x: Tensor) -> Tensor:
         """Apply Fourier expansion to a feature Tensor."""
         result = x.new_zeros(x.shape[0], 1 + 2 * self.order)
-        result[:, 0] = 1 / torch.sqrt(torch.tensor([2]))
+        result[:, 0] = 1 / math.sqrt(2)
         tmp = torch.outer(x, self.frequencies)
         result[:, 1 : self.order + 1] = torch.sin(tmp)
         result[:, self.order + 1 :] = torch.cos(tmp)
-        return result / np.sqrt(np.pi)
+        return result / math.sqrt(math.pi)
+
+    def forward_from_cos(self, cos: Tensor) -> Tensor:
+        """Apply Fourier expansion to angles given by their cosine, which skips the
+        arccos. With the canonical integer frequencies, cos(k * angle) and
+        sin(k * angle) are the Chebyshev polynomials T_k(cos) and
+        sin(angle) * U_{k-1}(cos), evaluated by their recurrences.
+        Only valid if the frequencies are not learnable.
+
+        Args:
+            cos (Tensor): cosine of the angles [n]
+
+        Returns:
+            Tensor: same expansion as forward(arccos(cos)) [n, 1 + 2 * order]
+        """
+        sin = torch.sqrt(1 - cos * cos)
+        cheb_t = [torch.ones_like(cos), cos]  # T_0, T_1
+        cheb_u = [torch.ones_like(cos), 2 * cos]  # U_0, U_1
+        for _ in range(2, self.order + 1):
+            cheb_t.append(2 * cos * cheb_t[-1] - cheb_t[-2])
+            cheb_u.append(2 * cos * cheb_u[-1] - cheb_u[-2])
+        result = cos.new_empty(cos.shape[0], 1 + 2 * self.order)
+        result[:, 0] = 1 / math.sqrt(2)
+        result[:, 1 : self.order + 1] = sin[:, None] * torch.stack(
+            cheb_u[: self.order], dim=1
+        )
+        result[:, self.order + 1 :] = torch.stack(cheb_t[1 : self.order + 1], dim=1)
+        return result / math.sqrt(math.pi)
 
 
 class RadialBessel(torch.nn.Module):
@@ -3,8 +3,10 @@ from __future__ import annotations
 import contextlib
 import io
 import pickle
-import sys
-from typing import TYPE_CHECKING, Literal
+import tempfile
+from collections import OrderedDict, deque
+from time import perf_counter
+from typing import TYPE_CHECKING, ClassVar, Literal
 
 import numpy as np
 import torch
@@ -21,23 +23,203 @@ from ase.optimize.fire import FIRE
 from ase.optimize.lbfgs import LBFGS, LBFGSLineSearch
 from ase.optimize.mdmin import MDMin
 from ase.optimize.sciopt import SciPyFminBFGS, SciPyFminCG
+from ase.stress import full_3x3_to_voigt_6_stress
 from pymatgen.analysis.eos import BirchMurnaghan
+from pymatgen.core.lattice import Lattice
+from pymatgen.core.periodic_table import Species
 from pymatgen.core.structure import Molecule, Structure
 from pymatgen.io.ase import AseAtomsAdaptor
 
-from chgnet.model.model import CHGNet
+from chgnet.graph import CrystalGraph, radius_graph_pbc_torch
+from chgnet.model.model import (
+    EV_PER_A3_TO_GPA,
+    PRECISIONS,
+    CHGNet,
+    message_passing_precision,
+)
 from chgnet.utils import cuda_devices_sorted_by_free_mem
 
 if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator, Sequence
+
     from ase.io import Trajectory
     from ase.optimize.optimize import Optimizer
 
+try:
+    import numba
+except ImportError:
+    numba = None
+
+try:
+    from torch.fx.experimental.proxy_tensor import make_fx
+except ImportError:
+    make_fx = None
+
 # We would like to thank M3GNet develop team for this module
 # source: https://github.com/materialsvirtuallab/m3gnet
 
+# CrystalGraph tensors passed to and predictions returned by an AOT-compiled model
+AOT_INPUTS = (
+    "atomic_number",
+    "atom_frac_coord",
+    "lattice",
+    "atom_graph",
+    "neighbor_image",
+    "directed2undirected",
+    "undirected2directed",
+    "bond_graph",
+)
+AOT_OUTPUTS = ("e", "f", "s", "m", "crystal_fea")
+# ASE defaults bound once, CHGNetCalculator.calculate runs every MD step
+_ALL_PROPERTIES = tuple(all_properties)
+_ALL_CHANGES = tuple(all_changes)
+
+
+def _jit(func):
+    """Compile func with numba if it is installed."""
+    if numba is None:
+        return func
+    return numba.njit(cache=True, fastmath=True)(func)
+
+
+@_jit
+def _fire_update(
+    velocities: np.ndarray,
+    forces: np.ndarray,
+    mix: bool,
+    dt: float,
+    a: float,
+    n_steps: int,
+    n_min: int,
+    finc: float,
+    fdec: float,
+    dtmax: float,
+    astart: float,
+    fa: float,
+    maxstep: float,
+) -> tuple[np.ndarray, float, float, int]:
+    """Update the flattened FIRE velocities in place and return the displacement.
+
+    Follows ase.optimize.FIRE.step, with the dot products, velocity mixing
+    and step clipping fused into two passes over the arrays.
+    """
+    n_dof = len(forces)
+    if mix:
+        vf = vv = ff = 0.0
+        for i in range(n_dof):
+            vf += velocities[i] * forces[i]
+            vv += velocities[i] * velocities[i]
+            ff += forces[i] * forces[i]
+        if vf > 0.0:
+            scale = a * np.sqrt(vv) / np.sqrt(ff)
+            for i in range(n_dof):
+                velocities[i] = (1.0 - a) * velocities[i] + scale * forces[i]
+            if n_steps > n_min:
+                dt = min(dt * finc, dtmax)
+                a *= fa
+            n_steps += 1
+        else:
+            velocities[:] = 0.0
+            a = astart
+            dt *= fdec
+            n_steps = 0
+
+    displacement = np.empty(n_dof)
+    norm = 0.0
+    for i in range(n_dof):
+        velocities[i] += dt * forces[i]
+        displacement[i] = dt * velocities[i]
+        norm += displacement[i] * displacement[i]
+    norm = np.sqrt(norm)
+    if norm > maxstep:
+        displacement *= maxstep / norm
+    return displacement, dt, a, n_steps
+
+
+@_jit
+def _bfgs_update_hessian(hessian: np.ndarray, dr: np.ndarray, df: np.ndarray) -> None:
+    """Apply the BFGS rank-two update of ase.optimize.BFGS.update in place."""
+    n_dof = len(dr)
+    dg = hessian @ dr
+    a = b = 0.0
+    for i in range(n_dof):
+        a += dr[i] * df[i]
+        b += dr[i] * dg[i]
+    for i in range(n_dof):
+        for j in range(n_dof):
+            hessian[i, j] -= df[i] * df[j] / a + dg[i] * dg[j] / b
+
+
+class JitFIRE(FIRE):
+    """ASE FIRE with the velocity and position update compiled by numba.
+
+    At small system sizes the numpy arithmetic of each FIRE step is a visible
+    fraction of the step time next to the CHGNet prediction. Without numba,
+    with downhill_check or above max_jit_atoms this falls back to ASE's FIRE.
+    """
+
+    # above this number of atoms the Python overhead of ASE's FIRE is negligible
+    max_jit_atoms = 1000
+
+    def step(self, f: np.ndarray | None = None) -> None:
+        """Take one FIRE step."""
+        atoms = self.atoms
+        if numba is None or self.downhill_check or len(atoms) > self.max_jit_atoms:
+            super().step(f)
+            return
+
+        if f is None:
+            f = atoms.get_forces()
+        mix = self.v is not None
+        if not mix:
+            self.v = np.zeros((len(atoms), 3))
+        dr, self.dt, self.a, self.Nsteps = _fire_update(
+            self.v.reshape(-1),
+            np.ascontiguousarray(f, dtype=np.float64).reshape(-1),
+            mix,
+            self.dt,
+            self.a,
+            self.Nsteps,
+            self.Nmin,
+            self.finc,
+            self.fdec,
+            self.dtmax,
+            self.astart,
+            self.fa,
+            self.maxstep,
+        )
+        atoms.set_positions(atoms.get_positions() + dr.reshape(-1, 3))
+        self.dump((self.v, self.dt))
+
+
+class JitBFGS(BFGS):
+    """ASE BFGS with the Hessian update compiled by numba.
+
+    The rank-two update is applied in place instead of building two dense
+    outer products per step. Without numba or above max_jit_atoms this falls
+    back to ASE's BFGS.
+    """
+
+    # above this number of atoms the Hessian diagonalization dominates the step
+    max_jit_atoms = 1000
+
+    def update(
+        self, r: np.ndarray, f: np.ndarray, r0: np.ndarray, f0: np.ndarray
+    ) -> None:
+        """Update the Hessian from the change in positions and forces."""
+        if numba is None or self.H is None or len(self.atoms) > self.max_jit_atoms:
+            super().update(r, f, r0, f0)
+            return
+        dr = np.asarray(r) - r0
+        if np.abs(dr).max() < 1e-7:
+            # Same configuration again (maybe a restart)
+            return
+        _bfgs_update_hessian(self.H, dr, f - f0)
+
+
 OPTIMIZERS = {
-    "FIRE": FIRE,
-    "BFGS": BFGS,
+    "FIRE": JitFIRE,
+    "BFGS": JitBFGS,
     "LBFGS": LBFGS,
     "LBFGSLineSearch": LBFGSLineSearch,
     "MDMin": MDMin,
@@ -52,12 +234,29 @@ class CHGNetCalculator(Calculator):
 
     implemented_properties = ("energy", "forces", "stress", "magmoms")
 
+    # number of eager calculations before the compiled forward is used
+    compile_warmup_steps = 3
+    # number of eager calculations before the model is captured into a CUDA graph
+    cuda_graph_warmup_steps = 3
+    # bond and angle counts are padded to multiples of this size, see _pad_graph
+    edge_bucket_size = 256
+    # number of captured CUDA graphs kept for reuse, see _predict_cuda_graph
+    cuda_graph_cache_size = 4
+
     def __init__(
         self,
         model: CHGNet | None = None,
         use_device: str | None = None,
-        stress_weight: float | None = 1 / 160.21766208,
+        stress_weight: float | None = 1 / EV_PER_A3_TO_GPA,
         on_isolated_atoms: Literal["ignore", "warn", "error"] = "warn",
+        direct: bool = False,
+        compile: bool = False,
+        use_cuda_graph: bool = False,
+        pad_edges: bool | None = None,
+        precision: Literal["fp32", "bf16", "fp16"] = "fp32",
+        skin: float = 0,
+        use_gpu_graph: bool = False,
+        model_path: str | None = None,
         **kwargs,
     ) -> None:
         """Provide a CHGNet instance to calculate various atomic properties using ASE.
@@ -75,6 +274,57 @@ class CHGNetCalculator(Calculator):
             on_isolated_atoms ('ignore' | 'warn' | 'error'): how to handle Structures
                 with isolated atoms.
                 Default = 'warn'
+            direct (bool): whether to build the crystal graph directly from the
+                Atoms arrays on the model device, skipping the conversion to a
+                pymatgen Structure.
+                Default = False
+            compile (bool): whether to run the model through
+                torch.compile(mode="reduce-overhead") after a few eager warmup
+                steps. Only used on cuda devices. Changes in the number of atoms
+                or bonds retrigger compilation, so this pays off most when the
+                graph shapes stay fixed between steps. The compiled steps
+                run with torch.set_float32_matmul_precision("high"), i.e. TF32
+                matmuls on GPUs that support them, and the previous precision
+                is restored after each step.
+                Default = False
+            use_cuda_graph (bool): whether to capture the model forward and
+                backward into a CUDA graph after a few eager warmup steps and
+                replay it while the graph shapes stay the same. A new graph is
+                captured when the number of atoms or bonds changes, keeping the
+                last cuda_graph_cache_size captures for reuse, and the calculator
+                falls back to eager execution if capture fails.
+                Only used on cuda devices.
+                Default = False
+            pad_edges (bool): whether to pad the bonds and angles of the crystal graph
+                up to multiples of edge_bucket_size with padding bonds that contribute
+                nothing to the prediction. The padded sizes only grow, so the graph
+                shapes stay fixed between steps unless a bucket overflows, which
+                avoids recompilation and CUDA graph recapture. Requires a model with
+                a smooth radial cutoff. If None, padding is used when compile or
+                use_cuda_graph is active.
+                Default = None
+            precision ('fp32' | 'bf16' | 'fp16'): precision of the message passing
+                layers. With 'bf16' or 'fp16' the model runs under torch.autocast,
+                while the graph geometry, basis expansions, composition model and
+                energy readout stay in fp32.
+                Default = 'fp32'
+            skin (float): Verlet skin in Angstrom for the neighbor search with
+                direct=True. Candidate pairs are searched within the atom graph
+                cutoff plus skin and reused, only filtering them by their current
+                distances, until an atom moves more than skin / 2 or the cell
+                changes. The atomic numbers also stay on the device between steps.
+                If 0, the neighbors are searched on every step.
+                Default = 0
+            use_gpu_graph (bool): whether to search the neighbors with
+                radius_graph_pbc_torch on the model device instead of with
+                pymatgen on the host when direct=True. The bond graph is still
+                built on the host. Best suited to small systems.
+                Default = False
+            model_path (str): path to a package written by aot_compile_calculator.
+                The AOT-compiled model is used while the atomic numbers and padded
+                graph sizes match the ones it was compiled for, and CHGNet runs
+                eagerly otherwise. model should be the model that was compiled.
+                Default = None
             **kwargs: Passed to the Calculator parent class.
         """
         super().__init__(**kwargs)
@@ -91,6 +341,83 @@ class CHGNetCalculator(Calculator):
         self.model = (model or CHGNet.load()).to(self.device)
         self.model.graph_converter.set_isolated_atom_response(on_isolated_atoms)
         self.stress_weight = stress_weight
+        # extensive energy of an intensive model is scaled by the number of atoms
+        self._energy_factor = len if self.model.is_intensive else lambda _atoms: 1
+        self.direct = direct
+        if precision not in PRECISIONS:
+            raise ValueError(f"{precision=} must be one of {list(PRECISIONS)}")
+        self.precision = precision
+
+        # Compiled model computation, swapped in after the eager warmup steps.
+        # Only CHGNet._compute_energy is compiled, so that forces and stress are
+        # still taken w.r.t. the positions and strains created by BatchedGraph
+        self._compiled_compute = None
+        self._n_calculations = 0
+        if compile:
+            if str(self.device).startswith("cuda"):
+                self._compiled_compute = torch.compile(
+                    self.model._compute_energy,
+                    mode="reduce-overhead",
+                    dynamic=True,
+                    fullgraph=False,
+                )
+            else:
+                print(f"torch.compile is only used on cuda, {self.device} runs eagerly")
+
+        # Captured CUDA graphs with their static input graph and output tensors,
+        # keyed by the graph tensor shapes and ordered from least recently used
+        self.use_cuda_graph = use_cuda_graph and str(self.device).startswith("cuda")
+        self._cuda_graphs: OrderedDict[
+            tuple, tuple[torch.cuda.CUDAGraph, CrystalGraph, dict[str, torch.Tensor]]
+        ] = OrderedDict()
+
+        # Padded graph sizes (n_atoms, n_directed, n_undirected, n_angles)
+        if pad_edges is None:
+            pad_edges = self._compiled_compute is not None or self.use_cuda_graph
+        rbf_cutoff = self.model.bond_basis_expansion.rbf_expansion_ag.smooth_cutoff
+        if pad_edges and (rbf_cutoff is None or rbf_cutoff.p == 0):
+            print("pad_edges requires a smooth radial cutoff, bonds are not padded")
+            pad_edges = False
+        self.pad_edges = pad_edges
+        self._edge_bucket: tuple[int, int, int, int] | None = None
+
+        # AOT-compiled model with the graph it was compiled for
+        self._aot_model = None
+        self._aot_bucket: tuple[int, int, int, int] | None = None
+        self._aot_atomic_numbers: np.ndarray | None = None
+        if model_path is not None:
+            self._aot_model = torch._inductor.aoti_load_package(model_path)
+            metadata = self._aot_model.get_metadata()
+            aot_device = metadata.get("AOTI_DEVICE_KEY")
+            if aot_device != torch.device(self.device).type:
+                raise ValueError(
+                    f"{model_path=} was compiled for {aot_device}, not {self.device}"
+                )
+            self._aot_bucket = tuple(
+                int(size) for size in metadata["chgnet_graph_sizes"].split(",")
+            )
+            self._aot_atomic_numbers = np.array(
+                metadata["chgnet_atomic_numbers"].split(","), dtype=int
+            )
+            self.pad_edges = True
+
+        # Pinned host buffer receiving the packed predictions, see _to_numpy
+        self._host_buffer: torch.Tensor | None = None
+
+        # Structure template reused across MD/relaxation steps, see _get_structure
+        self._cached_structure: Structure | None = None
+        self._cached_atomic_numbers: np.ndarray | None = None
+
+        # Neighbor candidates within cutoff + skin, see _neighbor_list
+        if skin and not direct:
+            print(
+                "skin is only used with direct=True, neighbors are searched every step"
+            )
+        self.skin = skin if direct else 0
+        if use_gpu_graph and not direct:
+            print("use_gpu_graph is only used with direct=True")
+        self.use_gpu_graph = use_gpu_graph and direct
+        self._neighbor_cache: dict | None = None
         print(f"CHGNet will run on {self.device}")
 
     def calculate(
@@ -108,8 +435,10 @@ class CHGNetCalculator(Calculator):
             system_changes (list | None): The changes made to the system.
                 Default is all changes.
         """
-        properties = properties or all_properties
-        system_changes = system_changes or all_changes
+        if properties is None:
+            properties = _ALL_PROPERTIES
+        if system_changes is None:
+            system_changes = _ALL_CHANGES
         super().calculate(
             atoms=atoms,
             properties=properties,
@@ -117,14 +446,30 @@ class CHGNetCalculator(Calculator):
         )
 
         # Run CHGNet
-        structure = AseAtomsAdaptor.get_structure(atoms)
-        graph = self.model.graph_converter(structure)
-        model_prediction = self.model.predict_graph(
-            graph.to(self.device), task="efsm", return_crystal_feas=True
-        )
+        graph = self._build_graph(atoms, system_changes)
+        with (
+            self._compiled_model(),
+            message_passing_precision(
+                self.device, self.precision, cache_enabled=not self.use_cuda_graph
+            ),
+        ):
+            if self._aot_model is not None and self._aot_accepts(atoms):
+                outputs = self._aot_model(*(getattr(graph, key) for key in AOT_INPUTS))
+                prediction = dict(zip(AOT_OUTPUTS, outputs))
+            elif (
+                self.use_cuda_graph
+                and self._n_calculations >= self.cuda_graph_warmup_steps
+            ):
+                prediction = self._predict_cuda_graph(graph)
+            else:
+                prediction = self.model.predict_tensors(
+                    graph, task="efsm", return_crystal_feas=True
+                )
+        self._n_calculations += 1
+        model_prediction = self._to_numpy(prediction)
 
         # Convert Result
-        factor = 1 if not self.model.is_intensive else structure.composition.num_atoms
+        factor = self._energy_factor(atoms)
         self.results.update(
             energy=model_prediction["e"] * factor,
             forces=model_prediction["f"],
@@ -134,6 +479,474 @@ class CHGNetCalculator(Calculator):
             crystal_fea=model_prediction["crystal_fea"],
         )
 
+    @contextlib.contextmanager
+    def _compiled_model(self) -> Iterator[None]:
+        """Route the model through torch.compile for the duration of one
+        calculation once the eager warmup is done, with TF32 matmuls allowed.
+        The model and the float32 matmul precision are restored afterwards, so
+        other users of the same CHGNet instance keep running eagerly in the
+        precision they chose.
+        """
+        if (
+            self._compiled_compute is None
+            or self._n_calculations < self.compile_warmup_steps
+        ):
+            yield
+            return
+        model_attrs = vars(self.model)
+        missing = object()
+        compute_energy = model_attrs.get("_compute_energy", missing)
+        matmul_precision = torch.get_float32_matmul_precision()
+        self.model._compute_energy = self._compiled_compute
+        torch.set_float32_matmul_precision("high")
+        try:
+            yield
+        finally:
+            torch.set_float32_matmul_precision(matmul_precision)
+            if compute_energy is missing:
+                model_attrs.pop("_compute_energy", None)
+            else:
+                self.model._compute_energy = compute_energy
+
+    def _build_graph(self, atoms: Atoms, system_changes: list) -> CrystalGraph:
+        """Build the crystal graph of atoms on the model device.
+
+        Args:
+            atoms (Atoms): the atoms to build the graph of.
+            system_changes (list): the changes made to the system.
+
+        Returns:
+            CrystalGraph: the crystal graph, padded if pad_edges is set.
+        """
+        if self.direct:
+            neighbor_list = atomic_numbers = None
+            if self.skin:
+                neighbor_list = self._neighbor_list(atoms)
+                atomic_numbers = self._neighbor_cache["atomic_numbers"]
+            elif self.use_gpu_graph:
+                neighbor_list = self._find_neighbors(
+                    atoms, cutoff=self.model.graph_converter.atom_graph_cutoff
+                )
+            graph = self.model.graph_converter.convert_arrays(
+                atomic_numbers=(
+                    atoms.numbers if atomic_numbers is None else atomic_numbers
+                ),
+                cart_coords=atoms.positions,
+                lattice=atoms.cell.array,
+                pbc=atoms.pbc,
+                composition=atoms.get_chemical_formula(),
+                device=self.device,
+                neighbor_list=neighbor_list,
+            )
+        else:
+            structure = self._get_structure(atoms, system_changes)
+            graph = self.model.graph_converter(structure).to(self.device)
+        if self.pad_edges:
+            graph = self._pad_graph(graph, atoms.cell.array)
+        return graph
+
+    def _aot_accepts(self, atoms: Atoms) -> bool:
+        """Check whether the AOT-compiled model was compiled for these atoms.
+
+        The compiled model only handles the atomic numbers and padded graph
+        sizes it was compiled for. Otherwise it is dropped, and CHGNet runs
+        eagerly from then on.
+        """
+        if self._edge_bucket == self._aot_bucket and np.array_equal(
+            atoms.numbers, self._aot_atomic_numbers
+        ):
+            return True
+        print(
+            "The AOT-compiled model does not match these atoms or their padded "
+            f"graph sizes {self._edge_bucket}, CHGNet runs eagerly"
+        )
+        self._aot_model = None
+        return False
+
+    def _to_numpy(self, prediction: dict[str, torch.Tensor]) -> dict[str, np.ndarray]:
+        """Copy the predicted tensors to numpy arrays with a single transfer.
+
+        All predictions are packed into one flat tensor, which is copied into a
+        reused pinned host buffer on cuda, so each step synchronizes with the
+        device only once.
+
+        Args:
+            prediction (dict[str, Tensor]): the predicted tensors on the model device.
+
+        Returns:
+            dict[str, np.ndarray]: the predictions as numpy arrays.
+        """
+        packed = torch.cat([tensor.reshape(-1) for tensor in prediction.values()])
+        if packed.is_cuda:
+            if self._host_buffer is None or len(self._host_buffer) < len(packed):
+                self._host_buffer = torch.empty(
+                    len(packed), dtype=packed.dtype, pin_memory=True
+                )
+            host_packed = self._host_buffer[: len(packed)]
+            host_packed.copy_(packed, non_blocking=True)
+            torch.cuda.current_stream(packed.device).synchronize()
+            # the buffer is overwritten by the next step
+            values = host_packed.numpy().copy()
+        else:
+            values = packed.cpu().numpy()
+
+        arrays, start = {}, 0
+        for key, tensor in prediction.items():
+            arrays[key] = values[start : start + tensor.numel()].reshape(tensor.shape)
+            start += tensor.numel()
+        return arrays
+
+    def _pad_graph(self, graph: CrystalGraph, cell: np.ndarray) -> CrystalGraph:
+        """Pad the bonds and angles of the graph to bucketed sizes.
+
+        The padding bonds connect the last atom to a periodic image of itself
+        beyond the atom graph cutoff, so their smoothed bond bases and bond weights
+        are exactly zero and they add nothing to the energy, forces or stress.
+        The padding angles only connect padding bonds. Both are appended after the
+        real bonds and angles, so the graph stays sorted by owner.
+
+        Args:
+            graph (CrystalGraph): the crystal graph to pad.
+            cell (np.ndarray): the lattice matrix of the crystal [3, 3]
+
+        Returns:
+            CrystalGraph: the padded crystal graph.
+        """
+        n_directed = len(graph.atom_graph)
+        n_undirected = len(graph.undirected2directed)
+        n_angles = len(graph.bond_graph)
+        bucket = self.edge_bucket_size
+        # keep at least one padding bond, which the padding angles point to,
+        # and two directed bonds per undirected bond as CrystalGraph requires
+        n_padded_undirected = (n_undirected // bucket + 1) * bucket
+        sizes = (
+            len(graph.atomic_number),
+            2 * n_padded_undirected,
+            n_padded_undirected,
+            -(-n_angles // bucket) * bucket,
+        )
+        previous = self._edge_bucket or self._aot_bucket
+        if previous is not None and previous[0] == sizes[0]:
+            sizes = tuple(map(max, sizes, previous))
+        self._edge_bucket = sizes
+        n_pad_directed = sizes[1] - n_directed
+        n_pad_undirected = sizes[2] - n_undirected
+        n_pad_angles = sizes[3] - n_angles
+
+        pad_atom = sizes[0] - 1
+        # shortest image of the padding bond that is beyond the cutoff
+        lengths = np.linalg.norm(cell, axis=1)
+        axis = int(np.argmax(lengths))
+        pad_image = graph.neighbor_image.new_zeros([n_pad_directed, 3])
+        pad_image[:, axis] = graph.atom_graph_cutoff // lengths[axis] + 1
+
+        bond_graph = graph.bond_graph
+        if n_pad_angles:
+            bond_graph = torch.cat(
+                [
+                    bond_graph.view(-1, 5),
+                    bond_graph.new_tensor(
+                        [pad_atom, n_undirected, n_directed, n_undirected, n_directed]
+                    ).repeat(n_pad_angles, 1),
+                ]
+            )
+        return CrystalGraph(
+            atomic_number=graph.atomic_number,
+            atom_frac_coord=graph.atom_frac_coord,
+            atom_graph=torch.cat(
+                [
+                    graph.atom_graph,
+                    graph.atom_graph.new_full([n_pad_directed, 2], pad_atom),
+                ]
+            ),
+            neighbor_image=torch.cat([graph.neighbor_image, pad_image]),
+            directed2undirected=torch.cat(
+                [
+                    graph.directed2undirected,
+                    graph.directed2undirected.new_full([n_pad_directed], n_undirected),
+                ]
+            ),
+            undirected2directed=torch.cat(
+                [
+                    graph.undirected2directed,
+                    graph.undirected2directed.new_full([n_pad_undirected], n_directed),
+                ]
+            ),
+            bond_graph=bond_graph,
+            lattice=graph.lattice,
+            graph_id=graph.graph_id,
+            mp_id=graph.mp_id,
+            composition=graph.composition,
+            atom_graph_cutoff=graph.atom_graph_cutoff,
+            bond_graph_cutoff=graph.bond_graph_cutoff,
+        )
+
+    def _predict_cuda_graph(self, graph: CrystalGraph) -> dict[str, torch.Tensor]:
+        """Predict the graph by replaying a captured CUDA graph.
+
+        The inputs of the new graph are copied into the static graph used at
+        capture time, so the CUDA graph can be replayed as long as all graph
+        tensors keep their shapes. Otherwise the model is captured again.
+
+        Args:
+            graph (CrystalGraph): the crystal graph on the model device.
+
+        Returns:
+            dict[str, Tensor]: the static output tensors of the CUDA graph.
+        """
+        tensors = {
+            key: val
+            for key, val in vars(graph).items()
+            if isinstance(val, torch.Tensor)
+        }
+        shapes = tuple((key, tensor.shape) for key, tensor in tensors.items())
+        if shapes in self._cuda_graphs:
+            self._cuda_graphs.move_to_end(shapes)
+            cuda_graph, static_graph, static_prediction = self._cuda_graphs[shapes]
+            with torch.no_grad():
+                for key, tensor in tensors.items():
+                    getattr(static_graph, key).copy_(tensor)
+        else:
+            try:
+                cuda_graph, static_prediction = self._capture_cuda_graph(graph)
+            except RuntimeError as exc:
+                print(f"CUDA graph capture failed, CHGNet runs eagerly: {exc}")
+                self.use_cuda_graph = False
+                self._cuda_graphs.clear()
+                return self.model.predict_tensors(
+                    graph, task="efsm", return_crystal_feas=True
+                )
+            self._cuda_graphs[shapes] = (cuda_graph, graph, static_prediction)
+            if len(self._cuda_graphs) > self.cuda_graph_cache_size:
+                self._cuda_graphs.popitem(last=False)
+        cuda_graph.replay()
+        return static_prediction
+
+    def _capture_cuda_graph(
+        self, graph: CrystalGraph
+    ) -> tuple[torch.cuda.CUDAGraph, dict[str, torch.Tensor]]:
+        """Capture the model forward and backward on graph into a CUDA graph.
+
+        Returns:
+            tuple[CUDAGraph, dict[str, Tensor]]: the CUDA graph and its static
+                output tensors, which are refilled on every replay.
+        """
+        # warm up on a side stream before capturing, as required by torch.cuda.graph
+        stream = torch.cuda.Stream()
+        stream.wait_stream(torch.cuda.current_stream())
+        with torch.cuda.stream(stream):
+            for _ in range(3):
+                self.model.predict_tensors(graph, task="efsm", return_crystal_feas=True)
+        torch.cuda.current_stream().wait_stream(stream)
+
+        cuda_graph = torch.cuda.CUDAGraph()
+        with torch.cuda.graph(cuda_graph):
+            static_prediction = self.model.predict_tensors(
+                graph, task="efsm", return_crystal_feas=True
+            )
+        return cuda_graph, static_prediction
+
+    def reset_compile_cache(self, keep_cuda_graphs: bool = False) -> None:
+        """Reset the compilation state before switching to a different system.
+
+        The warmup steps of torch.compile and CUDA graph capture start over, so
+        the first steps on the new system run eagerly instead of through
+        artifacts traced for the old one.
+        The padded edge bucket is dropped, so the new system is padded to its
+        own bond and angle counts.
+
+        Args:
+            keep_cuda_graphs (bool): whether to keep the captured CUDA graphs, so
+                they are replayed again when a system with the same graph shapes
+                returns, e.g. when cycling between a few systems.
+                Default = False
+        """
+        self._n_calculations = 0
+        self._edge_bucket = None
+        if not keep_cuda_graphs:
+            self._cuda_graphs.clear()
+
+    def _find_neighbors(self, atoms: Atoms, cutoff: float) -> tuple[np.ndarray, ...]:
+        """Find all neighbor pairs of atoms within cutoff, excluding self pairs.
+
+        Args:
+            atoms (Atoms): the atoms to find the neighbors of.
+            cutoff (float): the neighbor search radius.
+
+        Returns:
+            tuple[np.ndarray, ...]: center_index, neighbor_index, image and
+                distance of each pair
+        """
+        if not self.use_gpu_graph:
+            return self.model.graph_converter.find_neighbors(
+                atoms.positions, atoms.cell.array, atoms.pbc, cutoff=cutoff
+            )
+        # mps has no float64 support
+        dtype = torch.float32 if self.device == "mps" else torch.float64
+        neighbors = radius_graph_pbc_torch(
+            torch.as_tensor(atoms.positions, dtype=dtype, device=self.device),
+            torch.as_tensor(atoms.cell.array, dtype=dtype, device=self.device),
+            cutoff=cutoff,
+            pbc=atoms.pbc,
+        )
+        return tuple(tensor.cpu().numpy() for tensor in neighbors)
+
+    def _neighbor_list(self, atoms: Atoms) -> tuple[np.ndarray, ...]:
+        """Get the neighbor pairs within the atom graph cutoff using a Verlet skin.
+
+        The candidate pairs within cutoff + skin are searched again only when
+        the atoms, their cell or pbc change, or some atom has moved more than
+        half the skin since the last search, since no pair can then have
+        entered the cutoff sphere. Otherwise the candidates are filtered by
+        their current distances, which gives the same pairs as a new search.
+
+        Args:
+            atoms (Atoms): the atoms to find the neighbors of.
+
+        Returns:
+            tuple[np.ndarray, ...]: center_index, neighbor_index, image and
+                distance of each pair within the atom graph cutoff
+        """
+        converter = self.model.graph_converter
+        positions = atoms.positions
+        cell = atoms.cell.array
+        cache = self._neighbor_cache
+        if (
+            cache is None
+            or cache["key"] != (id(atoms), len(atoms))
+            or not np.array_equal(cache["numbers"], atoms.numbers)
+            or not np.array_equal(cache["cell"], cell)
+            or not np.array_equal(cache["pbc"], atoms.pbc)
+            or np.abs(positions - cache["positions"]).max(initial=0) > self.skin / 2
+        ):
+            cache = self._neighbor_cache = {
+                "key": (id(atoms), len(atoms)),
+                "numbers": atoms.numbers.copy(),
+                "cell": cell.copy(),
+                "pbc": atoms.pbc.copy(),
+                "positions": positions.copy(),
+                "atomic_numbers": torch.as_tensor(
+                    atoms.numbers, dtype=torch.int32, device=self.device
+                ),
+                "candidates": self._find_neighbors(
+                    atoms, cutoff=converter.atom_graph_cutoff + self.skin
+                )[:3],
+            }
+        center_index, neighbor_index, image = cache["candidates"]
+        vectors = positions[neighbor_index] + image @ cell - positions[center_index]
+        distance = np.linalg.norm(vectors, axis=1)
+        within = distance < converter.atom_graph_cutoff
+        return (
+            center_index[within],
+            neighbor_index[within],
+            image[within],
+            distance[within],
+        )
+
+    def _get_structure(self, atoms: Atoms, system_changes: list) -> Structure:
+        """Convert the atoms to a pymatgen Structure.
+
+        Between MD/relaxation steps usually only the positions (and sometimes the
+        cell) change, so the Structure built at the first step is cached and
+        updated in place instead of being rebuilt from scratch every step.
+
+        Args:
+            atoms (Atoms): the atoms to convert.
+            system_changes (list): the changes made to the system since the last
+                calculation.
+
+        Returns:
+            Structure: the structure with the current lattice and coordinates.
+        """
+        atomic_numbers = atoms.get_atomic_numbers()
+        if (
+            self._cached_structure is None
+            or "numbers" in system_changes
+            or "pbc" in system_changes
+            or not np.array_equal(atomic_numbers, self._cached_atomic_numbers)
+        ):
+            self._cached_structure = AseAtomsAdaptor.get_structure(atoms)
+            self._cached_atomic_numbers = atomic_numbers
+            return self._cached_structure
+
+        structure = self._cached_structure
+        cell = atoms.get_cell()[:]
+        if not np.array_equal(cell, structure.lattice.matrix):
+            structure.lattice = Lattice(cell)
+        for site, frac_coord in zip(structure, atoms.get_scaled_positions(wrap=False)):
+            site.frac_coords = frac_coord
+        return structure
+
+
+def aot_compile_calculator(
+    model: CHGNet | None,
+    example_atoms: Atoms | Structure,
+    out_path: str,
+    use_device: str | None = None,
+) -> str:
+    """Compile the CHGNet prediction of energy, forces, stress and magmoms ahead
+    of time with AOTInductor.
+
+    The compiled package can be loaded with CHGNetCalculator(model_path=...) in
+    later processes without paying the torch.compile cost again. It is compiled
+    for the atomic numbers of example_atoms and the padded graph sizes of their
+    crystal graph plus one edge bucket, see CHGNetCalculator.pad_edges, so it
+    suits MD runs and relaxations of the same system.
+
+    Args:
+        model (CHGNet): instance of a CHGNet model. If set to None,
+            the pretrained CHGNet is loaded.
+        example_atoms (Atoms | Structure): the system to compile the model for.
+        out_path (str): path of the compiled package, usually ending in '.pt2'.
+        use_device (str, optional): the device to compile the model for.
+            Default = None
+
+    Returns:
+        str: the path of the compiled package.
+    """
+    if make_fx is None or not hasattr(torch._inductor, "aoti_compile_and_package"):
+        raise RuntimeError("aot_compile_calculator requires torch>=2.6")
+    if isinstance(example_atoms, Structure):
+        example_atoms = AseAtomsAdaptor.get_atoms(example_atoms)
+
+    calculator = CHGNetCalculator(model=model, use_device=use_device, pad_edges=True)
+    if not calculator.pad_edges:
+        raise ValueError("AOT compilation requires a model with a smooth radial cutoff")
+    calculator._build_graph(example_atoms, all_changes)
+    # leave one bucket of headroom, since bond and angle counts fluctuate in MD
+    n_atoms, _, n_undirected, n_angles = calculator._edge_bucket
+    n_undirected += calculator.edge_bucket_size
+    n_angles += calculator.edge_bucket_size
+    calculator._edge_bucket = (n_atoms, 2 * n_undirected, n_undirected, n_angles)
+    graph = calculator._build_graph(example_atoms, all_changes)
+    model = calculator.model.eval()
+    converter = model.graph_converter
+
+    def predict(*tensors: torch.Tensor) -> tuple[torch.Tensor, ...]:
+        crystal_graph = CrystalGraph(
+            **dict(zip(AOT_INPUTS, tensors)),
+            atom_graph_cutoff=converter.atom_graph_cutoff,
+            bond_graph_cutoff=converter.bond_graph_cutoff,
+        )
+        prediction = model.predict_tensors(
+            crystal_graph, task="efsm", return_crystal_feas=True
+        )
+        return tuple(prediction[key] for key in AOT_OUTPUTS)
+
+    # torch.export cannot trace through torch.autograd.grad, so the forward and
+    # the force and stress backward are first traced into one graph of aten ops
+    inputs = tuple(getattr(graph, key).detach() for key in AOT_INPUTS)
+    traced = make_fx(predict, _allow_non_fake_inputs=True)(*inputs)
+    metadata = {
+        "chgnet_graph_sizes": ",".join(map(str, calculator._edge_bucket)),
+        "chgnet_atomic_numbers": ",".join(map(str, example_atoms.numbers)),
+    }
+    return torch._inductor.aoti_compile_and_package(
+        torch.export.export(traced, inputs),
+        package_path=out_path,
+        inductor_configs={"aot_inductor.metadata": metadata},
+    )
+
 
 class StructOptimizer:
     """Wrapper class for structural relaxation."""
@@ -143,7 +956,7 @@ class StructOptimizer:
         model: CHGNet | CHGNetCalculator | None = None,
         optimizer_class: Optimizer | str | None = "FIRE",
         use_device: str | None = None,
-        stress_weight: float = 1 / 160.21766208,
+        stress_weight: float = 1 / EV_PER_A3_TO_GPA,
         on_isolated_atoms: Literal["ignore", "warn", "error"] = "warn",
     ) -> None:
         """Provide a trained CHGNet model and an optimizer to relax crystal structures.
@@ -152,7 +965,8 @@ class StructOptimizer:
             model (CHGNet): instance of a CHGNet model or CHGNetCalculator.
                 If set to None, the pretrained CHGNet is loaded.
                 Default = None
-            optimizer_class (Optimizer,str): choose optimizer from ASE.
+            optimizer_class (Optimizer,str): choose optimizer from ASE. "FIRE" and
+                "BFGS" select JitFIRE and JitBFGS, which use numba if installed.
                 Default = "FIRE"
             use_device (str, optional): The device to be used for predictions,
                 either "cpu", "cuda", or "mps". If not specified, the default device is
@@ -194,6 +1008,7 @@ class StructOptimizer:
         loginterval: int | None = 1,
         crystal_feas_save_path: str | None = None,
         verbose: bool = True,
+        track: Sequence[str] = ("energy",),
         **kwargs,
     ) -> dict[str, Structure | TrajectoryObserver]:
         """Relax the Structure/Atoms until maximum force is smaller than fmax.
@@ -215,6 +1030,11 @@ class StructOptimizer:
                 Default = None
             verbose (bool): Whether to print the output of the ASE optimizer.
                 Default = True
+            track (Sequence[str]): the properties recorded in the trajectory, any
+                of 'energy', 'forces', 'stress', 'magmoms', 'positions' and 'cell'.
+                The trajectory fields of properties that are not tracked are
+                empty, e.g. trajectory.forces needs 'forces' in track.
+                Default = ("energy",)
             **kwargs: Additional parameters for the optimizer.
 
         Returns:
@@ -226,9 +1046,17 @@ class StructOptimizer:
 
         atoms.calc = self.calculator  # assign model used to predict forces
 
-        stream = sys.stdout if verbose else io.StringIO()
-        with contextlib.redirect_stdout(stream):
-            obs = TrajectoryObserver(atoms)
+        redirect = (
+            contextlib.nullcontext()
+            if verbose
+            else contextlib.redirect_stdout(io.StringIO())
+        )
+        with redirect:
+            obs = TrajectoryObserver(
+                atoms,
+                keys=track,
+                max_steps=steps // (loginterval or 1) + 2 if steps else None,
+            )
 
             if crystal_feas_save_path:
                 cry_obs = CrystalFeasObserver(atoms)
@@ -242,7 +1070,10 @@ class StructOptimizer:
                 optimizer.attach(cry_obs, interval=loginterval)
 
             optimizer.run(fmax=fmax, steps=steps)
-            obs()
+            if optimizer.nsteps % (loginterval or 1):
+                # the final step falls between log intervals, record it from
+                # the results the calculator already holds for these positions
+                obs()
 
         if save_path is not None:
             obs.save(save_path)
@@ -252,46 +1083,540 @@ class StructOptimizer:
 
         if isinstance(atoms, ExpCellFilter):
             atoms = atoms.atoms
-        struct = AseAtomsAdaptor.get_structure(atoms)
-        for key in struct.site_properties:
-            struct.remove_site_property(property_name=key)
-        struct.add_site_property(
-            "magmom", [float(magmom) for magmom in atoms.get_magnetic_moments()]
-        )
+        struct = _relaxed_structure(atoms, atoms.get_magnetic_moments())
         return {"final_structure": struct, "trajectory": obs}
 
+    def relax_iter(
+        self, atoms_iter: Iterable[Structure | Atoms], **kwargs
+    ) -> Iterator[dict[str, Structure | TrajectoryObserver]]:
+        """Relax a stream of structures one after the other.
+
+        Each result is yielded as soon as its relaxation finishes, so lazily
+        generated inputs are never held in memory all at once. All relaxations
+        share this optimizer's calculator, whose cached Structure template and
+        padded graph sizes carry over between structures of the same size.
+        A fresh optimizer and cell filter is created per structure, since ASE
+        keeps per-structure state in both (e.g. the FIRE time step and the
+        reference cell), and creating them is cheap next to a CHGNet step.
+        Use relax_many to relax many structures at fixed cell in batches.
+
+        Args:
+            atoms_iter (Iterable[Structure | Atoms]): the structures to relax.
+            **kwargs: passed to relax.
+
+        Yields:
+            dict[str, Structure | TrajectoryObserver]: the result of relax
+                for each structure.
+        """
+        for atoms in atoms_iter:
+            yield self.relax(atoms, **kwargs)
+
+    def relax_many(
+        self,
+        atoms_list: Sequence[Structure | Atoms],
+        fmax: float = 0.1,
+        steps: int = 500,
+        batch_size: int | None = None,
+    ) -> list[dict[str, Structure | float | np.ndarray | int | bool]]:
+        """Relax the atomic positions of many structures at once with FIRE.
+
+        Instead of running one ASE optimizer per structure, the structures are
+        predicted together in batched CHGNet forward passes and stepped by a
+        FIRE optimizer vectorized over all atoms in the batch, using the ASE
+        FIRE default parameters. Converged structures leave the batch and are
+        replaced by the next structures in the queue. Lattices are kept fixed.
+
+        Args:
+            atoms_list (Sequence[Structure | Atoms]): the structures to relax.
+            fmax (float): The maximum force tolerance for relaxation.
+                Default = 0.1
+            steps (int): The maximum number of steps for each relaxation.
+                Default = 500
+            batch_size (int | None): the number of structures relaxed together.
+                If None, it is tuned by timing batched forward passes.
+                Default = None
+
+        Returns:
+            list[dict]: for each input structure, a dictionary with the
+                'final_structure', its total 'energy' in eV, the 'forces'
+                in eV/A, the number of 'steps' taken and whether the relaxation
+                'converged', in the order of atoms_list.
+        """
+        atoms_list = [
+            AseAtomsAdaptor.get_atoms(atoms) if isinstance(atoms, Structure) else atoms
+            for atoms in atoms_list
+        ]
+        if batch_size is None:
+            batch_size = self._tune_batch_size(atoms_list)
+        model = self.calculator.model
+        device = self.calculator.device
+        model.eval()
+
+        pending = deque(range(len(atoms_list)))
+        results: list[dict] = [{} for _ in atoms_list]
+        members: list[int] = []
+        positions = torch.zeros([0, 3], dtype=torch.float64, device=device)
+        state = _FIREState.empty(device)
+        while pending or members:
+            # Fill up the batch with new structures
+            new_members = []
+            while pending and len(members) + len(new_members) < batch_size:
+                new_members.append(pending.popleft())
+            if new_members:
+                members += new_members
+                positions = torch.cat(
+                    [positions]
+                    + [
+                        torch.tensor(atoms_list[idx].positions, device=device)
+                        for idx in new_members
+                    ]
+                )
+                state = state.extend([len(atoms_list[idx]) for idx in new_members])
+
+            # Predict the whole batch
+            cart_coords = np.split(positions.cpu().numpy(), state.offsets[1:-1])
+            graphs = [
+                model.graph_converter.convert_arrays(
+                    atomic_numbers=atoms_list[idx].numbers,
+                    cart_coords=coords,
+                    lattice=atoms_list[idx].cell.array,
+                    pbc=atoms_list[idx].pbc,
+                    device=device,
+                )
+                for idx, coords in zip(members, cart_coords)
+            ]
+            prediction = model(graphs, task="efm", create_graph=False)
+            forces = torch.cat(prediction["f"]).detach().to(torch.float64)
+
+            # Remove the structures that are converged or out of steps
+            max_force_sq = torch.zeros(len(members), dtype=forces.dtype, device=device)
+            max_force_sq = max_force_sq.scatter_reduce(
+                0, state.owners, (forces**2).sum(dim=1), reduce="amax"
+            )
+            converged = (max_force_sq < fmax**2).cpu().numpy()
+            finished = converged | (state.n_steps.cpu().numpy() >= steps)
+            if finished.any():
+                energies = prediction["e"].detach().cpu().numpy()
+                for batch_idx in np.flatnonzero(finished):
+                    idx = members[batch_idx]
+                    atoms = atoms_list[idx].copy()
+                    start, end = state.offsets[batch_idx : batch_idx + 2]
+                    atoms.positions = positions[start:end].cpu().numpy()
+                    struct = _relaxed_structure(
+                        atoms, prediction["m"][batch_idx].detach().cpu().numpy()
+                    )
+                    energy = energies[batch_idx]
+                    if model.is_intensive:
+                        energy *= len(atoms)
+                    results[idx] = {
+                        "final_structure": struct,
+                        "energy": float(energy),
+                        "forces": forces[start:end].cpu().numpy(),
+                        "steps": int(state.n_steps[batch_idx]),
+                        "converged": bool(converged[batch_idx]),
+                    }
+                keep = torch.from_numpy(~finished).to(device)
+                atom_keep = keep[state.owners]
+                members = [idx for idx, done in zip(members, finished) if not done]
+                positions, forces = positions[atom_keep], forces[atom_keep]
+                state = state.select(keep)
+                if not members:
+                    continue
+
+            positions = positions + state.step(forces)
+
+        return results
+
+    def _tune_batch_size(
+        self, atoms_list: Sequence[Atoms], max_batch_size: int = 64
+    ) -> int:
+        """Find the batch size with the lowest forward time per structure.
+
+        The batch size is doubled as long as the time per structure of a
+        batched energy and force prediction keeps decreasing.
+
+        Args:
+            atoms_list (Sequence[Atoms]): the structures whose leading entries
+                are used for timing.
+            max_batch_size (int): the largest batch size to try.
+                Default = 64
+
+        Returns:
+            int: the tuned batch size.
+        """
+        model = self.calculator.model
+        device = self.calculator.device
+        model.eval()
+        best_batch_size, best_time = 1, float("inf")
+        batch_size = 1
+        while batch_size <= min(len(atoms_list), max_batch_size):
+            graphs = [
+                model.graph_converter.convert_arrays(
+                    atomic_numbers=atoms.numbers,
+                    cart_coords=atoms.positions,
+                    lattice=atoms.cell.array,
+                    pbc=atoms.pbc,
+                    device=device,
+                )
+                for atoms in atoms_list[:batch_size]
+            ]
+            try:
+                start = perf_counter()
+                prediction = model(graphs, task="ef", create_graph=False)
+                prediction["e"].cpu()
+                time_per_structure = (perf_counter() - start) / batch_size
+            except RuntimeError:  # out of memory
+                break
+            if time_per_structure >= best_time:
+                break
+            best_batch_size, best_time = batch_size, time_per_structure
+            batch_size *= 2
+        return best_batch_size
+
+
+def _relaxed_structure(atoms: Atoms, magmoms: np.ndarray) -> Structure:
+    """Build the relaxed Structure of atoms with magmom as its only site property.
+
+    Matches AseAtomsAdaptor.get_structure, including oxidation states, without
+    first adding the site properties of atoms and removing them again.
+    """
+    species = atoms.get_chemical_symbols()
+    if atoms.has("oxi_states"):
+        species = [
+            Species(symbol, oxi_state)
+            for symbol, oxi_state in zip(species, atoms.get_array("oxi_states"))
+        ]
+    return Structure(
+        Lattice(atoms.cell.array),
+        species,
+        atoms.positions,
+        coords_are_cartesian=True,
+        site_properties={"magmom": np.asarray(magmoms, dtype=float).tolist()},
+    )
+
+
+class _FIREState:
+    """The FIRE optimizer state of a batch of structures.
+
+    The per-atom velocities and per-structure time steps and mixing parameters
+    of all structures in a batch are stored in flat tensors, so that one FIRE
+    step (same algorithm and defaults as ase.optimize.FIRE) updates all
+    structures at once.
+    """
+
+    dt_start = 0.1
+    maxstep = 0.2
+    dtmax = 1.0
+    Nmin = 5
+    finc = 1.1
+    fdec = 0.5
+    astart = 0.1
+    fa = 0.99
+
+    def __init__(
+        self,
+        velocities: torch.Tensor,
+        owners: torch.Tensor,
+        dt: torch.Tensor,
+        a: torch.Tensor,
+        n_positive: torch.Tensor,
+        n_steps: torch.Tensor,
+        offsets: list[int],
+    ) -> None:
+        """Initialize the FIRE state.
+
+        Args:
+            velocities (Tensor): velocities of the atoms [n_atoms, 3]
+            owners (Tensor): index of the structure each atom belongs to [n_atoms]
+            dt (Tensor): time step of each structure [n_structures]
+            a (Tensor): velocity mixing parameter of each structure [n_structures]
+            n_positive (Tensor): number of consecutive steps with positive power
+                of each structure [n_structures]
+            n_steps (Tensor): number of steps taken by each structure [n_structures]
+            offsets (list[int]): index of the first atom of each structure, followed
+                by the total number of atoms [n_structures + 1]
+        """
+        self.velocities = velocities
+        self.owners = owners
+        self.dt = dt
+        self.a = a
+        self.n_positive = n_positive
+        self.n_steps = n_steps
+        self.offsets = offsets
+
+    @classmethod
+    def empty(cls, device: str) -> _FIREState:
+        """Create the state of an empty batch."""
+        float_zeros = torch.zeros(0, dtype=torch.float64, device=device)
+        long_zeros = torch.zeros(0, dtype=torch.long, device=device)
+        return cls(
+            velocities=float_zeros.view(0, 3),
+            owners=long_zeros,
+            dt=float_zeros,
+            a=float_zeros,
+            n_positive=long_zeros,
+            n_steps=long_zeros,
+            offsets=[0],
+        )
+
+    def extend(self, n_atoms: list[int]) -> _FIREState:
+        """Add new structures with the given numbers of atoms to the batch."""
+        device = self.owners.device
+        n_structures, n_new = len(self.dt), len(n_atoms)
+        new_owners = torch.arange(n_structures, n_structures + n_new, device=device)
+        counts = torch.tensor(n_atoms, device=device)
+        return _FIREState(
+            velocities=torch.cat(
+                [self.velocities, self.velocities.new_zeros([sum(n_atoms), 3])]
+            ),
+            owners=torch.cat([self.owners, new_owners.repeat_interleave(counts)]),
+            dt=torch.cat([self.dt, self.dt.new_full([n_new], self.dt_start)]),
+            a=torch.cat([self.a, self.a.new_full([n_new], self.astart)]),
+            n_positive=torch.cat([self.n_positive, self.n_positive.new_zeros(n_new)]),
+            n_steps=torch.cat([self.n_steps, self.n_steps.new_zeros(n_new)]),
+            offsets=self.offsets + (self.offsets[-1] + np.cumsum(n_atoms)).tolist(),
+        )
+
+    def select(self, keep: torch.Tensor) -> _FIREState:
+        """Keep only the structures where keep is True."""
+        atom_keep = keep[self.owners]
+        n_atoms = np.diff(self.offsets)[keep.cpu().numpy()]
+        return _FIREState(
+            velocities=self.velocities[atom_keep],
+            owners=torch.arange(len(n_atoms), device=keep.device).repeat_interleave(
+                torch.tensor(n_atoms, device=keep.device)
+            ),
+            dt=self.dt[keep],
+            a=self.a[keep],
+            n_positive=self.n_positive[keep],
+            n_steps=self.n_steps[keep],
+            offsets=[0, *np.cumsum(n_atoms).tolist()],
+        )
+
+    def _sum(self, values: torch.Tensor) -> torch.Tensor:
+        """Sum per-atom values over each structure."""
+        return values.new_zeros(len(self.dt)).index_add_(0, self.owners, values)
+
+    def step(self, forces: torch.Tensor) -> torch.Tensor:
+        """Update the state with the forces and return the position changes.
+
+        Args:
+            forces (Tensor): forces on the atoms [n_atoms, 3]
+
+        Returns:
+            Tensor: the displacements of the atoms [n_atoms, 3]
+        """
+        # The first step of each structure starts from zero velocity
+        started = self.n_steps > 0
+        power = self._sum((forces * self.velocities).sum(dim=1))
+        mixing = started & (power > 0)
+        reset = started & ~mixing
+
+        force_norm = self._sum((forces**2).sum(dim=1)).sqrt().clamp(min=1e-30)
+        velocity_norm = self._sum((self.velocities**2).sum(dim=1)).sqrt()
+        mixed = (1 - self.a)[self.owners, None] * self.velocities + (
+            self.a * velocity_norm / force_norm
+        )[self.owners, None] * forces
+        self.velocities = torch.where(mixing[self.owners, None], mixed, self.velocities)
+        self.velocities = torch.where(
+            reset[self.owners, None],
+            torch.zeros_like(self.velocities),
+            self.velocities,
+        )
+
+        grow = mixing & (self.n_positive > self.Nmin)
+        self.dt = torch.where(
+            grow, (self.dt * self.finc).clamp(max=self.dtmax), self.dt
+        )
+        self.dt = torch.where(reset, self.dt * self.fdec, self.dt)
+        self.a = torch.where(grow, self.a * self.fa, self.a)
+        self.a = torch.where(reset, torch.full_like(self.a, self.astart), self.a)
+        self.n_positive = torch.where(
+            mixing, self.n_positive + 1, torch.zeros_like(self.n_positive)
+        )
+
+        self.velocities = self.velocities + self.dt[self.owners, None] * forces
+        displacements = self.dt[self.owners, None] * self.velocities
+        step_norm = self._sum((displacements**2).sum(dim=1)).sqrt()
+        scale = (self.maxstep / step_norm.clamp(min=1e-30)).clamp(max=1)
+        self.n_steps = self.n_steps + 1
+        return displacements * scale[self.owners, None]
+
 
 class TrajectoryObserver:
     """Trajectory observer is a hook in the relaxation process that saves the
     intermediate structures.
+
+    The recorded properties are written into preallocated numpy buffers, one
+    per property, that grow geometrically when full. Buffers larger than
+    memmap_threshold elements are backed by temporary files on disk.
     """
 
-    def __init__(self, atoms: Atoms) -> None:
+    # name of the recorded frames of each property
+    property_names: ClassVar[dict[str, str]] = {
+        "energy": "energies",
+        "forces": "forces",
+        "stress": "stresses",
+        "magmoms": "magmoms",
+        "positions": "atom_positions",
+        "cell": "cells",
+    }
+    # dtype of the buffer of each recorded property
+    dtypes: ClassVar[dict[str, type]] = {
+        "energies": np.float64,
+        "forces": np.float32,
+        "stresses": np.float32,
+        "magmoms": np.float32,
+        "atom_positions": np.float64,
+        "cells": np.float64,
+    }
+
+    def __init__(
+        self,
+        atoms: Atoms,
+        keys: Sequence[str] = ("energy", "forces"),
+        max_steps: int | None = None,
+        save_interval: int = 1,
+        memmap_threshold: int = 50_000_000,
+    ) -> None:
         """Create a TrajectoryObserver from an Atoms object.
 
         Args:
             atoms (Atoms): the structure to observe.
+            keys (Sequence[str]): the properties to record, any of 'energy',
+                'forces', 'stress', 'magmoms', 'positions' and 'cell'.
+                Default = ("energy", "forces")
+            max_steps (int | None): the expected number of times the observer is
+                called, used to preallocate the buffers. More steps can still be
+                recorded, at the cost of growing the buffers.
+                Default = None
+            save_interval (int): only record every save_interval-th call.
+                Default = 1
+            memmap_threshold (int): number of elements above which a buffer is
+                memory-mapped to a temporary file instead of kept in memory.
+                Default = 50_000_000
         """
+        unknown_keys = {*keys} - {*self.property_names}
+        if unknown_keys:
+            raise ValueError(f"{unknown_keys=} must be in {list(self.property_names)}")
         self.atoms = atoms
-        self.energies: list[float] = []
-        self.forces: list[np.ndarray] = []
-        self.stresses: list[np.ndarray] = []
-        self.magmoms: list[np.ndarray] = []
-        self.atom_positions: list[np.ndarray] = []
-        self.cells: list[np.ndarray] = []
+        self.keys = tuple(keys)
+        self.save_interval = save_interval
+        self.memmap_threshold = memmap_threshold
+        self._capacity = (
+            16 if max_steps is None else max(1, -(-max_steps // save_interval))
+        )
+        self._buffers: dict[str, np.ndarray] = {}
+        self._n_calls = 0
+        self._n_frames = 0
 
     def __call__(self):
         """The logic for saving the properties of an Atoms during the relaxation."""
-        self.energies.append(self.compute_energy())
-        self.forces.append(self.atoms.get_forces())
-        self.stresses.append(self.atoms.get_stress())
-        self.magmoms.append(self.atoms.get_magnetic_moments())
-        self.atom_positions.append(self.atoms.get_positions())
-        self.cells.append(self.atoms.get_cell()[:])
+        self._n_calls += 1
+        if (self._n_calls - 1) % self.save_interval != 0:
+            return
+        results = self._current_results()
+        self._record(
+            **{
+                self.property_names[key]: self._get_property(key, results)
+                for key in self.keys
+            }
+        )
+
+    def _current_results(self) -> dict:
+        """Get the calculator results if they belong to the current atoms.
+
+        The atoms are compared with the last calculation only once per step,
+        instead of once per property by the ASE property getters.
+        """
+        calc = self.atoms.calc
+        if calc is not None and not calc.check_state(self.atoms):
+            return calc.results
+        return {}
+
+    def _get_property(self, key: str, results: dict) -> np.ndarray | float:
+        """Get a property of the atoms.
+
+        Calculator properties are read from results when these are up to date,
+        instead of going through the ASE property getters.
+        """
+        if key == "positions":
+            return self.atoms.get_positions()
+        if key == "cell":
+            return self.atoms.get_cell()[:]
+        if key == "energy":
+            return results["energy"] if "energy" in results else self.compute_energy()
+        if key not in results or (key == "forces" and self.atoms.constraints):
+            return {
+                "forces": self.atoms.get_forces,
+                "stress": self.atoms.get_stress,
+                "magmoms": self.atoms.get_magnetic_moments,
+            }[key]()
+        if key == "stress" and np.shape(results[key]) == (3, 3):
+            return full_3x3_to_voigt_6_stress(results[key])
+        return results[key]
+
+    def _record(self, **frame: np.ndarray | float) -> None:
+        """Write one frame of properties into the buffers."""
+        if self._n_frames == self._capacity:
+            self._capacity *= 2
+            for key, buffer in self._buffers.items():
+                self._buffers[key] = self._allocate(buffer.shape[1:], buffer.dtype)
+                self._buffers[key][: self._n_frames] = buffer[: self._n_frames]
+        for key, value in frame.items():
+            if key not in self._buffers:
+                self._buffers[key] = self._allocate(np.shape(value), self.dtypes[key])
+            self._buffers[key][self._n_frames] = value
+        self._n_frames += 1
+
+    def _allocate(self, frame_shape: tuple[int, ...], dtype) -> np.ndarray:
+        """Allocate a buffer holding self._capacity frames of frame_shape."""
+        shape = (self._capacity, *frame_shape)
+        if np.prod(shape) > self.memmap_threshold:
+            return np.memmap(
+                tempfile.TemporaryFile(), dtype=dtype, mode="w+", shape=shape
+            )
+        return np.empty(shape, dtype=dtype)
+
+    def _frames(self, key: str) -> np.ndarray:
+        """The recorded frames of a property."""
+        if key not in self._buffers:
+            return np.empty(0, dtype=self.dtypes[key])
+        return self._buffers[key][: self._n_frames]
+
+    @property
+    def energies(self) -> np.ndarray:
+        """Potential energies of the recorded steps [n_steps]."""
+        return self._frames("energies")
+
+    @property
+    def forces(self) -> np.ndarray:
+        """Forces of the recorded steps [n_steps, n_atoms, 3]."""
+        return self._frames("forces")
+
+    @property
+    def stresses(self) -> np.ndarray:
+        """Stresses in Voigt notation of the recorded steps [n_steps, 6]."""
+        return self._frames("stresses")
+
+    @property
+    def magmoms(self) -> np.ndarray:
+        """Magnetic moments of the recorded steps [n_steps, n_atoms]."""
+        return self._frames("magmoms")
+
+    @property
+    def atom_positions(self) -> np.ndarray:
+        """Atom positions of the recorded steps [n_steps, n_atoms, 3]."""
+        return self._frames("atom_positions")
+
+    @property
+    def cells(self) -> np.ndarray:
+        """Lattice matrices of the recorded steps [n_steps, 3, 3]."""
+        return self._frames("cells")
 
     def __len__(self) -> int:
         """The number of steps in the trajectory."""
-        return len(self.energies)
+        return self._n_frames
 
     def compute_energy(self) -> float:
         """Calculate the potential energy.
@@ -299,6 +1624,9 @@ class TrajectoryObserver:
         Returns:
             energy (float): the potential energy.
         """
+        results = self._current_results()
+        if "energy" in results:
+            return results["energy"]
         return self.atoms.get_potential_energy()
 
     def save(self, filename: str) -> None:
@@ -308,12 +1636,12 @@ class TrajectoryObserver:
             filename (str): filename to save the trajectory
         """
         out_pkl = {
-            "energy": self.energies,
-            "forces": self.forces,
-            "stresses": self.stresses,
-            "magmoms": self.magmoms,
-            "atom_positions": self.atom_positions,
-            "cell": self.cells,
+            "energy": np.array(self.energies),
+            "forces": np.array(self.forces),
+            "stresses": np.array(self.stresses),
+            "magmoms": np.array(self.magmoms),
+            "atom_positions": np.array(self.atom_positions),
+            "cell": np.array(self.cells),
             "atomic_number": self.atoms.get_atomic_numbers(),
         }
         with open(filename, "wb") as file:
@@ -367,6 +1695,7 @@ class MolecularDynamics:
         append_trajectory: bool = False,
         on_isolated_atoms: Literal["ignore", "warn", "error"] = "warn",
         use_device: str | None = None,
+        use_cuda_graph: bool = False,
     ) -> None:
         """Initialize the MD class.
 
@@ -428,6 +1757,10 @@ class MolecularDynamics:
                 Default = 'warn'
             use_device (str): the device for the MD run
                 Default = None
+            use_cuda_graph (bool): whether to replay the model forward and backward
+                from a captured CUDA graph while the atom and bond counts stay fixed,
+                see CHGNetCalculator. Only used when the calculator is created here.
+                Default = False
         """
         self.ensemble = ensemble
         self.thermostat = thermostat
@@ -442,6 +1775,7 @@ class MolecularDynamics:
                 model=model,
                 use_device=use_device,
                 on_isolated_atoms=on_isolated_atoms,
+                use_cuda_graph=use_cuda_graph,
             )
 
         if taut is None:
@@ -645,6 +1979,8 @@ class MolecularDynamics:
             atoms (Atoms): new atoms for running MD
         """
         calculator = self.atoms.calc
+        if isinstance(calculator, CHGNetCalculator) and len(atoms) != len(self.atoms):
+            calculator.reset_compile_cache(keep_cuda_graphs=True)
         self.atoms = atoms
         self.dyn.atoms = atoms
         self.dyn.atoms.calc = calculator
@@ -686,7 +2022,7 @@ class EquationOfState:
         model: CHGNet | CHGNetCalculator | None = None,
         optimizer_class: Optimizer | str | None = "FIRE",
         use_device: str | None = None,
-        stress_weight: float = 1 / 160.21766208,
+        stress_weight: float = 1 / EV_PER_A3_TO_GPA,
         on_isolated_atoms: Literal["ignore", "warn", "error"] = "error",
     ) -> None:
         """Initialize a structure optimizer object for calculation of bulk modulus.
@@ -23,7 +23,8 @@ class AtomEmbedding(nn.Module):
         """Convert the structure to a atom embedding tensor.
 
         Args:
-            atomic_numbers (Tensor): [n_atom, 1].
+            atomic_numbers (Tensor): [n_atom, 1], shifted by one so that the
+                first embedding row belongs to hydrogen (Z=1).
 
         Returns:
             atom_fea (Tensor): atom embeddings [n_atom, atom_feature_dim].
@@ -83,7 +84,8 @@ class BondEncoder(nn.Module):
                 directed bond [n_bond]
             image (Tensor): the periodic image specifying the location of neighboring
                 atom [n_bond, 3]
-            lattice (Tensor): the lattice of this structure [3, 3]
+            lattice (Tensor): the lattice of this structure [3, 3], or the lattice
+                of the structure each bond belongs to [n_bond, 3, 3]
 
         Returns:
             bond_basis_ag (Tensor): the bond basis in AtomGraph [n_bond, num_radial]
@@ -91,7 +93,13 @@ class BondEncoder(nn.Module):
             bond_vectors (Tensor): normalized bond vectors, for tracking the bond
                 directions [n_bond, 3]
         """
-        neighbor = neighbor + image @ lattice
+        # shift the neighbors to their periodic images in a single fused gemm
+        neighbor = neighbor.to(lattice.dtype)
+        if lattice.dim() == 2:
+            neighbor = torch.addmm(neighbor, image, lattice)
+        else:
+            neighbor = torch.baddbmm(neighbor[:, None], image[:, None], lattice)
+            neighbor = neighbor.squeeze(1)
         bond_vectors = center - neighbor
         bond_lengths = torch.norm(bond_vectors, dim=1)
         # Normalize the bond vectors
@@ -102,8 +110,31 @@ class BondEncoder(nn.Module):
         undirected_bond_lengths = torch.index_select(
             bond_lengths, 0, undirected2directed
         )
-        bond_basis_ag = self.rbf_expansion_ag(undirected_bond_lengths)
-        bond_basis_bg = self.rbf_expansion_bg(undirected_bond_lengths)
+
+        # Same as RadialBessel.forward for both expansions (in the same order of
+        # operations), but with a single sin over their concatenated frequencies
+        rbf_ag, rbf_bg = self.rbf_expansion_ag, self.rbf_expansion_bg
+        n_ag, n_bg = rbf_ag.num_radial, rbf_bg.num_radial
+        dist = undirected_bond_lengths[:, None]
+        inv_cutoffs = torch.cat(
+            [
+                torch.full((n_ag,), rbf_ag.inv_cutoff, device=dist.device),
+                torch.full((n_bg,), rbf_bg.inv_cutoff, device=dist.device),
+            ]
+        )
+        frequencies = torch.cat([rbf_ag.frequencies, rbf_bg.frequencies])
+        norm_consts = torch.cat(
+            [
+                torch.full((n_ag,), rbf_ag.norm_const, device=dist.device),
+                torch.full((n_bg,), rbf_bg.norm_const, device=dist.device),
+            ]
+        )
+        bessel = norm_consts * torch.sin(frequencies * (dist * inv_cutoffs)) / dist
+        bond_basis_ag, bond_basis_bg = bessel.split([n_ag, n_bg], dim=1)
+        if rbf_ag.smooth_cutoff is not None:
+            bond_basis_ag = self.rbf_expansion_ag.smooth_cutoff(dist) * bond_basis_ag
+        if rbf_bg.smooth_cutoff is not None:
+            bond_basis_bg = self.rbf_expansion_bg.smooth_cutoff(dist) * bond_basis_bg
         return bond_basis_ag, bond_basis_bg, bond_vectors
 
 
@@ -136,7 +167,10 @@ class AngleEncoder(nn.Module):
         Returns:
             angle_fea (Tensor):  expanded cos_ij [n_angle, angle_feature_dim]
         """
-        # 1 - 1e-6 for torch.acos stability
+        # 1 - 1e-6 keeps the gradients of torch.acos and sqrt(1 - cos^2) finite
         cosine_ij = torch.sum(bond_i * bond_j, dim=1) * (1 - 1e-6)
+        if not self.fourier_expansion.learnable:
+            # canonical frequencies are expanded from the cosine directly
+            return self.fourier_expansion.forward_from_cos(cosine_ij)
         angle = torch.acos(cosine_ij)
         return self.fourier_expansion(angle)
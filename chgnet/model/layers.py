@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import torch
 from torch import Tensor, nn
+from torch.utils.checkpoint import checkpoint
 
 from chgnet.model.functions import (
     MLP,
@@ -26,6 +27,7 @@ class AtomConv(nn.Module):
         use_mlp_out: bool = True,
         resnet: bool = True,
         gMLP_norm: str | None = None,
+        recompute_messages: bool = False,
     ) -> None:
         """Initialize the AtomConv layer.
 
@@ -52,10 +54,16 @@ class AtomConv(nn.Module):
             gMLP_norm (str, optional): The name of the normalization layer to use on the
                 gated MLP. Must be one of "batch", "layer", or None.
                 Default = None
+            recompute_messages (bool, optional): Whether to drop the directed bond
+                messages after aggregation and recompute them in the backward pass.
+                This trades one extra message computation for not keeping the
+                [num_directed_bonds, hidden_dim] intermediates alive for autograd.
+                Default = False
         """
         super().__init__()
         self.use_mlp_out = use_mlp_out
         self.resnet = resnet
+        self.recompute_messages = recompute_messages
         self.activation = find_activation(activation)
         self.twoBody_atom = GatedMLP(
             input_dim=2 * atom_fea_dim + bond_fea_dim,
@@ -90,7 +98,7 @@ class AtomConv(nn.Module):
             bond_weights (Tensor): AtomGraph bond weights with shape
                 [num_undirected_bonds, bond_fea_dim]
             atom_graph (Tensor): Directed AtomGraph adjacency list with shape
-                [num_directed_bonds, 2]
+                [num_directed_bonds, 2], sorted by the center atom
             directed2undirected (Tensor): Index tensor that maps directed bonds to
                 undirected bonds.with shape
                 [num_undirected_bonds]
@@ -102,6 +110,45 @@ class AtomConv(nn.Module):
         Notes:
             - num_batch_atoms = sum(num_atoms) in batch
         """
+        if self.recompute_messages and torch.is_grad_enabled():
+            new_atom_feas = checkpoint(
+                self._aggregate_messages,
+                atom_feas,
+                bond_feas,
+                bond_weights,
+                atom_graph,
+                directed2undirected,
+                use_reentrant=False,
+            )
+        else:
+            new_atom_feas = self._aggregate_messages(
+                atom_feas, bond_feas, bond_weights, atom_graph, directed2undirected
+            )
+
+        # New atom features
+        if self.use_mlp_out:
+            new_atom_feas = self.mlp_out(new_atom_feas)
+        if self.resnet:
+            new_atom_feas += atom_feas
+
+        # Optionally, normalize new atom features
+        if self.atom_norm is not None:
+            new_atom_feas = self.atom_norm(new_atom_feas)
+        return new_atom_feas
+
+    def _aggregate_messages(
+        self,
+        atom_feas: Tensor,
+        bond_feas: Tensor,
+        bond_weights: Tensor,
+        atom_graph: Tensor,
+        directed2undirected: Tensor,
+    ) -> Tensor:
+        """Compute the directed bond messages and sum them onto the center atoms.
+
+        Returns:
+            Tensor: the aggregated messages with shape [num_batch_atom, atom_fea_dim]
+        """
         # Make directional messages
         center_atoms = torch.index_select(atom_feas, 0, atom_graph[:, 0])
         nbr_atoms = torch.index_select(atom_feas, 0, atom_graph[:, 1])
@@ -114,21 +161,14 @@ class AtomConv(nn.Module):
         messages = messages * bond_weight
 
         # Aggregate messages
-        new_atom_feas = aggregate(
-            messages, atom_graph[:, 0], average=False, num_owner=len(atom_feas)
+        return aggregate(
+            messages,
+            atom_graph[:, 0],
+            average=False,
+            num_owner=len(atom_feas),
+            sorted_owners=True,
         )
 
-        # New atom features
-        if self.use_mlp_out:
-            new_atom_feas = self.mlp_out(new_atom_feas)
-        if self.resnet:
-            new_atom_feas += atom_feas
-
-        # Optionally, normalize new atom features
-        if self.atom_norm is not None:
-            new_atom_feas = self.atom_norm(new_atom_feas)
-        return new_atom_feas
-
 
 class BondConv(nn.Module):
     """A convolution Layer to update bond features."""
@@ -211,7 +251,7 @@ class BondConv(nn.Module):
             angle_feas (Tensor): angle features tensor with shape
                 [num_batch_angles, angle_fea_dim]
             bond_graph (Tensor): Directed BondGraph tensor with shape
-                [num_batched_angles, 3]
+                [num_batched_angles, 3], sorted by the first bond
 
         Returns:
             new_bond_feas (Tensor): bond feature tensor with shape
@@ -236,7 +276,11 @@ class BondConv(nn.Module):
 
         # Aggregate messages
         new_bond_feas = aggregate(
-            bond_update, bond_graph[:, 1], average=False, num_owner=len(bond_feas)
+            bond_update,
+            bond_graph[:, 1],
+            average=False,
+            num_owner=len(bond_feas),
+            sorted_owners=True,
         )
 
         # New bond features
@@ -358,7 +402,12 @@ class GraphPooling(nn.Module):
         super().__init__()
         self.average = average
 
-    def forward(self, atom_feas: Tensor, atom_owner: Tensor) -> Tensor:
+    def forward(
+        self,
+        atom_feas: Tensor,
+        atom_owner: Tensor,
+        atoms_per_graph: Tensor | None = None,
+    ) -> Tensor:
         """Merge the atom features that belong to same graph in a batched graph.
 
         Args:
@@ -366,11 +415,24 @@ class GraphPooling(nn.Module):
                 [num_batch_atoms, atom_fea_dim or 1]
             atom_owner (Tensor): graph indices for each atom.
                 [num_batch_atoms]
+            atoms_per_graph (Tensor, optional): number of atoms in each graph, if
+                the atoms are sorted by owner. If given outside of training, the
+                graphs are reduced with a single segment_reduce instead of a
+                scatter add. segment_reduce has no double backward, so training
+                with force or stress losses keeps the scatter add.
+                [n_crystals]
+                Default = None
 
         Returns:
             crystal_feas (Tensor): crystal feature matrix.
                 [n_crystals, atom_fea_dim or 1]
         """
+        if atoms_per_graph is not None and not self.training:
+            return torch.segment_reduce(
+                atom_feas,
+                "mean" if self.average else "sum",
+                lengths=atoms_per_graph,
+            )
         return aggregate(atom_feas, atom_owner, average=self.average)
 
 
@@ -1,11 +1,14 @@
 from __future__ import annotations
 
+import contextlib
 import math
 import os
 from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from typing import TYPE_CHECKING, Literal
 
+import numpy as np
 import torch
 from pymatgen.core import Structure
 from torch import Tensor, nn
@@ -27,6 +30,193 @@ if TYPE_CHECKING:
     from chgnet import PredTask
 
 
+# converts stress from eV/A^3 to GPa
+EV_PER_A3_TO_GPA = 160.21766208
+
+# autocast dtypes of the message passing layers
+PRECISIONS = {"fp32": None, "bf16": torch.bfloat16, "fp16": torch.float16}
+
+
+def autocast_dtype(device: torch.device) -> torch.dtype | None:
+    """The dtype torch.autocast casts to on the device, None if autocast is not
+    enabled there. Needs torch>=2.4 for the device type autocast queries.
+    """
+    if torch.is_autocast_enabled(device.type):
+        return torch.get_autocast_dtype(device.type)
+    return None
+
+
+def full_precision(device: torch.device) -> torch.autocast:
+    """Context manager that disables autocast on the device for numerically
+    sensitive parts of the model.
+    """
+    return torch.autocast(device_type=device.type, enabled=False)
+
+
+def message_passing_precision(
+    device: torch.device | str,
+    precision: Literal["fp32", "bf16", "fp16"] = "fp32",
+    cache_enabled: bool = True,
+) -> contextlib.AbstractContextManager:
+    """Context manager that runs the model under torch.autocast in the given
+    precision. The graph geometry, basis expansions, composition model and
+    readout of CHGNet opt out of it with full_precision and stay in fp32.
+
+    Args:
+        device (torch.device | str): the device the model runs on
+        precision ('fp32' | 'bf16' | 'fp16'): precision of the message passing.
+            Default = 'fp32'
+        cache_enabled (bool): whether autocast caches the casted weights.
+            Default = True
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"{precision=} must be one of {list(PRECISIONS)}")
+    dtype = PRECISIONS[precision]
+    if dtype is None:
+        return contextlib.nullcontext()
+    return torch.autocast(
+        device_type=torch.device(device).type, dtype=dtype, cache_enabled=cache_enabled
+    )
+
+
+def _graph_offsets(starts: Tensor, repeats: Tensor, total: int) -> Tensor:
+    """Start index of every graph in a batched tensor, repeated once for each
+    row the graph contributes to another batched tensor with total rows.
+    """
+    return starts.repeat_interleave(repeats, output_size=total)
+
+
+def _split_to_numpy(tensors: Sequence[Tensor]) -> list[np.ndarray]:
+    """Copy prediction tensors to numpy with a single device to host transfer
+    for each dtype, instead of one transfer and sync for each tensor.
+    """
+    arrays: list[np.ndarray] = [None] * len(tensors)  # type: ignore[list-item]
+    for dtype in {tensor.dtype for tensor in tensors}:
+        indices = [idx for idx, tensor in enumerate(tensors) if tensor.dtype == dtype]
+        flat = torch.cat([tensors[idx].detach().reshape(-1) for idx in indices])
+        chunks = np.split(
+            flat.cpu().numpy(), np.cumsum([tensors[idx].numel() for idx in indices])
+        )
+        for idx, chunk in zip(indices, chunks):
+            arrays[idx] = chunk.reshape(tensors[idx].shape)
+    return arrays
+
+
+class _PinnedStaging:
+    """Pinned host buffers, one per tensor field of CrystalGraph, that move a
+    batch of cpu graphs to cuda with one asynchronous copy per field instead of
+    a blocking copy per field of every graph. The buffers are reused between
+    batches and only grow when a batch needs more room than any before it.
+    """
+
+    fields = (
+        "atomic_number",
+        "atom_frac_coord",
+        "atom_graph",
+        "neighbor_image",
+        "directed2undirected",
+        "undirected2directed",
+        "bond_graph",
+        "lattice",
+    )
+
+    def __init__(self) -> None:
+        """Start without buffers, they are allocated by the first batch."""
+        self.buffers: dict[str, Tensor] = {}
+        # recorded after the copies of the last batch, which read the buffers
+        self.copied: torch.cuda.Event | None = None
+
+    def to(
+        self, graphs: Sequence[CrystalGraph], device: torch.device
+    ) -> list[CrystalGraph]:
+        """Copy the graphs to a cuda device through the pinned buffers.
+
+        Args:
+            graphs (list[CrystalGraph]): graphs on the cpu
+            device (torch.device): the cuda device to move them to
+
+        Returns:
+            list[CrystalGraph]: the graphs on device, their tensors are views of
+                one batched tensor per field
+        """
+        if self.copied is not None:
+            self.copied.synchronize()
+        moved: dict[str, list[Tensor]] = {}
+        for field in self.fields:
+            tensors = [getattr(graph, field) for graph in graphs]
+            sizes = [tensor.numel() for tensor in tensors]
+            buffer = self.buffers.get(field)
+            if (
+                buffer is None
+                or buffer.dtype != tensors[0].dtype
+                or len(buffer) < sum(sizes)
+            ):
+                # grow geometrically, so slowly growing batches rarely reallocate
+                numel = max(sum(sizes), 0 if buffer is None else 2 * len(buffer))
+                buffer = torch.empty(numel, dtype=tensors[0].dtype, pin_memory=True)
+                self.buffers[field] = buffer
+            staged = buffer[: sum(sizes)]
+            with torch.no_grad():
+                torch.cat([tensor.reshape(-1) for tensor in tensors], out=staged)
+            flat = staged.to(device, non_blocking=True)
+            # same as tensor.to, the moved fields keep their requires_grad
+            flat.requires_grad_(any(tensor.requires_grad for tensor in tensors))
+            chunks = flat.split(sizes)
+            moved[field] = [
+                chunk.view(tensor.shape) for chunk, tensor in zip(chunks, tensors)
+            ]
+        self.copied = torch.cuda.Event()
+        self.copied.record()
+        return [
+            CrystalGraph(
+                **{field: moved[field][idx] for field in self.fields},
+                atom_graph_cutoff=graph.atom_graph_cutoff,
+                bond_graph_cutoff=graph.bond_graph_cutoff,
+                graph_id=graph.graph_id,
+                mp_id=graph.mp_id,
+                composition=graph.composition,
+            )
+            for idx, graph in enumerate(graphs)
+        ]
+
+
+def _strained_lattices(
+    graphs: Sequence[CrystalGraph], compute_stress: bool
+) -> tuple[Tensor, Tensor | None, Tensor]:
+    """Stack the lattices of a batch of graphs, apply a zero strain leaf to them
+    if stress is computed, and take all volumes in one batched triple product.
+
+    Returns:
+        lattices (Tensor): the (strained) lattices [batch_size, 3, 3]
+        strains (Tensor | None): the strains, None if stress is not computed
+            [batch_size, 3, 3]
+        volumes (Tensor): the detached volumes of the lattices [batch_size]
+    """
+    lattices = torch.stack([graph.lattice for graph in graphs])
+    if compute_stress:
+        strains = lattices.new_zeros([len(graphs), 3, 3], requires_grad=True)
+        # same as lattices @ (I + strains), without building an identity
+        lattices = lattices + lattices @ strains
+    else:
+        strains = None
+    volumes = (
+        (lattices[:, 0] * torch.linalg.cross(lattices[:, 1], lattices[:, 2]))
+        .sum(dim=1)
+        .detach()
+        .to(datatype)
+    )
+    return lattices, strains, volumes
+
+
+def prediction_grad_mode(task: PredTask) -> contextlib.AbstractContextManager:
+    """Context manager for predictions, which runs tasks that need no forces or
+    stress under torch.inference_mode to skip all autograd bookkeeping.
+    """
+    if "f" in task or "s" in task:
+        return contextlib.nullcontext()
+    return torch.inference_mode()
+
+
 class CHGNet(nn.Module):
     """Crystal Hamiltonian Graph neural Network
     A model that takes in a crystal graph and output energy, force, magmom, stress.
@@ -58,6 +248,7 @@ class CHGNet(nn.Module):
         graph_converter_algorithm: Literal["legacy", "fast"] = "fast",
         cutoff_coeff: int = 5,
         learnable_rbf: bool = True,
+        scripted: bool = False,
         **kwargs,
     ) -> None:
         """Initialize the CHGNet.
@@ -135,7 +326,13 @@ class CHGNet(nn.Module):
             learnable_rbf (bool): whether to set the frequencies in rbf and Fourier
                 basis functions learnable.
                 Default = True
-            **kwargs: Additional keyword arguments
+            scripted (bool): whether to compile the atom embedding and the bond and
+                angle basis expansions with torch.jit.script. These run on every
+                forward pass and are pure tensor ops. Leave this off when the model
+                goes through torch.compile or torch.export instead.
+                Default = False
+            **kwargs: Additional keyword arguments, verbose=True prints the number
+                of model parameters
         """
         # Store model args for reconstruction
         self.model_args = {
@@ -188,6 +385,10 @@ class CHGNet(nn.Module):
         self.bond_weights_ag = nn.Linear(
             in_features=num_radial, out_features=atom_fea_dim, bias=False
         )
+        # stacked bond_embedding and bond_weights_ag weights used for inference
+        self._bond_ag_weight_cache: tuple[tuple, Tensor] | None = None
+        # pinned buffers that stage cpu graphs for predictions on cuda
+        self._pinned_staging: _PinnedStaging | None = None
         self.bond_weights_bg = nn.Linear(
             in_features=num_radial, out_features=bond_fea_dim, bias=False
         )
@@ -197,10 +398,15 @@ class CHGNet(nn.Module):
         self.angle_embedding = nn.Linear(
             in_features=num_angular, out_features=angle_fea_dim, bias=False
         )
+        if scripted:
+            self.atom_embedding = torch.jit.script(self.atom_embedding)
+            self.bond_basis_expansion = torch.jit.script(self.bond_basis_expansion)
+            self.angle_basis_expansion = torch.jit.script(self.angle_basis_expansion)
 
         # Define convolutional layers
         conv_norm = kwargs.pop("conv_norm", None)
         gMLP_norm = kwargs.pop("gMLP_norm", None)
+        recompute_messages = kwargs.pop("recompute_messages", False)
         atom_graph_layers = [
             AtomConv(
                 atom_fea_dim=atom_fea_dim,
@@ -212,6 +418,7 @@ class CHGNet(nn.Module):
                 gMLP_norm=gMLP_norm,
                 use_mlp_out=True,
                 resnet=True,
+                recompute_messages=recompute_messages,
             )
             for _ in range(n_conv)
         ]
@@ -298,10 +505,11 @@ class CHGNet(nn.Module):
                 nn.Linear(in_features=mlp_hidden_dims[-1], out_features=1),
             )
 
-        print(
-            f"CHGNet initialized with {sum(p.numel() for p in self.parameters()):,} "
-            f"parameters"
-        )
+        if kwargs.pop("verbose", False):
+            print(
+                f"CHGNet initialized with {sum(p.numel() for p in self.parameters()):,} "
+                f"parameters"
+            )
 
     def forward(
         self,
@@ -310,6 +518,7 @@ class CHGNet(nn.Module):
         return_site_energies: bool = False,
         return_atom_feas: bool = False,
         return_crystal_feas: bool = False,
+        create_graph: bool = True,
     ) -> dict:
         """Get prediction associated with input graphs
         Args:
@@ -325,21 +534,34 @@ class CHGNet(nn.Module):
                 Default = False
             return_crystal_feas (bool): whether to return crystal feature.
                 Default = False
+            create_graph (bool): whether to build the graph of the force and
+                stress computation, so they can be differentiated again, e.g. in
+                a force loss or for Hessians. This is independent of train/eval
+                mode. predict_graph, predict_structure and the calculator set it
+                to False, which frees the backward graph right away.
+                Default = True
         Returns:
             model output (dict).
         """
-        # Optionally, make composition model prediction
-        comp_energy = (
-            0 if self.composition_model is None else self.composition_model(graphs)
-        )
+        # The composition model and graph geometry always run in full precision,
+        # also if the model is called under torch.autocast
+        basis_dtype = autocast_dtype(graphs[0].atomic_number.device)
+        with full_precision(graphs[0].atomic_number.device):
+            # Optionally, make composition model prediction
+            comp_energy = (
+                0 if self.composition_model is None else self.composition_model(graphs)
+            )
 
-        # Make batched graph
-        batched_graph = BatchedGraph.from_graphs(
-            graphs,
-            bond_basis_expansion=self.bond_basis_expansion,
-            angle_basis_expansion=self.angle_basis_expansion,
-            compute_stress="s" in task,
-        )
+            # Make batched graph
+            # Under autocast, the bases are stored in the autocast dtype that
+            # the first layers would cast them to anyway
+            batched_graph = BatchedGraph.from_graphs(
+                graphs,
+                bond_basis_expansion=self.bond_basis_expansion,
+                angle_basis_expansion=self.angle_basis_expansion,
+                compute_stress="s" in task,
+                basis_dtype=basis_dtype,
+            )
 
         # Pass to model
         prediction = self._compute(
@@ -350,6 +572,7 @@ class CHGNet(nn.Module):
             return_site_energies=return_site_energies,
             return_atom_feas=return_atom_feas,
             return_crystal_feas=return_crystal_feas,
+            create_graph=create_graph,
         )
         prediction["e"] += comp_energy
         if return_site_energies and self.composition_model is not None:
@@ -368,6 +591,7 @@ class CHGNet(nn.Module):
         return_site_energies: bool = False,
         return_atom_feas: bool = False,
         return_crystal_feas: bool = False,
+        create_graph: bool = True,
     ) -> dict:
         """Get Energy, Force, Stress, Magmom associated with input graphs
         force = - d(Energy)/d(atom_positions)
@@ -388,6 +612,9 @@ class CHGNet(nn.Module):
                 Default = False
             return_crystal_feas (bool): whether to return crystal features.
                 Default = False
+            create_graph (bool): whether to build the graph of the force and
+                stress computation.
+                Default = True
 
         Returns:
             prediction (dict): containing the fields:
@@ -396,23 +623,109 @@ class CHGNet(nn.Module):
                 s (Tensor) : stress of structure [3 * batch_size, 3]
                 m (Tensor) : magnetic moments of sites [num_batch_atoms, 3]
         """
+        prediction, energy = self._compute_energy(
+            g,
+            compute_magmom=compute_magmom,
+            return_site_energies=return_site_energies,
+            return_atom_feas=return_atom_feas,
+            return_crystal_feas=return_crystal_feas,
+            create_graph=create_graph,
+        )
+
+        # Compute force and stress
+        if compute_force or compute_stress:
+            # Need to create_graph here, because energy is used in loss function,
+            # so its gradient need to be calculated later
+            # The graphs of force and stress need to be created for same reason.
+            # Predictions pass create_graph=False to free the backward graph.
+            # Force and stress are taken from a single backward pass of the energy
+            grad_inputs = []
+            if compute_force:
+                grad_inputs.append(g.atom_positions)
+            if compute_stress:
+                grad_inputs.append(g.strains)
+            # the negated energy gives the forces directly, instead of negating
+            # the [n_atoms, 3] gradient afterwards
+            grads = torch.autograd.grad(
+                -energy.sum(),
+                grad_inputs,
+                create_graph=create_graph,
+                retain_graph=create_graph,
+            )
+            if compute_force:
+                prediction["f"] = list(torch.split(grads[0], g.n_atoms))
+                grads = grads[1:]
+            if compute_stress:
+                # Convert Stress unit from eV/A^3 to GPa, undoing the negation
+                scale = -EV_PER_A3_TO_GPA / g.volumes
+                prediction["s"] = list(grads[0] * scale[:, None, None])
+
+        # Normalize energy if model is intensive
+        if self.is_intensive:
+            energy = energy / prediction["atoms_per_graph"]
+        prediction["e"] = energy
+
+        return prediction
+
+    def _compute_energy(
+        self,
+        g,
+        compute_magmom: bool = False,
+        return_site_energies: bool = False,
+        return_atom_feas: bool = False,
+        return_crystal_feas: bool = False,
+        create_graph: bool = True,
+    ) -> tuple[dict, Tensor]:
+        """Run the message passing and readout of CHGNet on a batched graph.
+        This is everything in _compute besides the autograd.grad call for
+        forces and stress, so it can be compiled on its own, see compile_forward.
+
+        Args:
+            g (BatchedGraph): batched graph
+            compute_magmom (bool): whether to compute magmom.
+                Default = False
+            return_site_energies (bool): whether to return per-site energies,
+                only available if self.mlp_first == True
+                Default = False
+            return_atom_feas (bool): whether to return atom features.
+                Default = False
+            return_crystal_feas (bool): whether to return crystal features.
+                Default = False
+            create_graph (bool): whether the forces and stress taken from the
+                energy are differentiated again.
+                Default = True
+
+        Returns:
+            prediction (dict): the atoms per graph and the requested magmoms,
+                site energies and features
+            energy (Tensor): total energy of each structure [batch_size]
+        """
         prediction = {}
-        atoms_per_graph = torch.bincount(g.atom_owners)
+        # the graph sizes are known on the host, so splitting the atoms does
+        # not wait on the device
+        n_atoms = g.n_atoms
+        atoms_per_graph = g.atoms_per_graph
         prediction["atoms_per_graph"] = atoms_per_graph
 
         # Embed Atoms, Bonds and Angles
         atom_feas = self.atom_embedding(
             g.atomic_numbers - 1
         )  # let H be the first embedding column
-        bond_feas = self.bond_embedding(g.bond_bases_ag)
-        bond_weights_ag = self.bond_weights_ag(g.bond_bases_ag)
+        # bond_embedding and bond_weights_ag share their input, so they are
+        # applied as a single matmul and split afterwards
+        bond_feas, bond_weights_ag = nn.functional.linear(
+            g.bond_bases_ag, self._bond_ag_weight()
+        ).split([self.bond_fea_dim, self.atom_fea_dim], dim=1)
         bond_weights_bg = self.bond_weights_bg(g.bond_bases_bg)
-        if len(g.angle_bases) != 0:
+        has_angles = len(g.angle_bases) != 0
+        if has_angles:
             angle_feas = self.angle_embedding(g.angle_bases)
 
         # Message Passing
+        # zip stops at the n_conv - 1 bond and angle layers, which leaves out the
+        # last atom conv without slicing a new ModuleList on every forward
         for idx, (atom_layer, bond_layer, angle_layer) in enumerate(
-            zip(self.atom_conv_layers[:-1], self.bond_conv_layers, self.angle_layers)
+            zip(self.atom_conv_layers, self.bond_conv_layers, self.angle_layers)
         ):
             # Atom Conv
             atom_feas = atom_layer(
@@ -424,7 +737,7 @@ class CHGNet(nn.Module):
             )
 
             # Bond Conv
-            if len(g.angle_bases) != 0 and bond_layer is not None:
+            if has_angles and bond_layer is not None:
                 bond_feas = bond_layer(
                     atom_feas=atom_feas,
                     bond_feas=bond_feas,
@@ -443,15 +756,12 @@ class CHGNet(nn.Module):
                     )
             if idx == self.n_conv - 2:
                 if return_atom_feas:
-                    prediction["atom_fea"] = torch.split(
-                        atom_feas, atoms_per_graph.tolist()
-                    )
-                # Compute site-wise magnetic moments
+                    prediction["atom_fea"] = torch.split(atom_feas.float(), n_atoms)
+                # Compute site-wise magnetic moments in full precision
                 if compute_magmom:
-                    magmom = torch.abs(self.site_wise(atom_feas))
-                    prediction["m"] = list(
-                        torch.split(magmom.view(-1), atoms_per_graph.tolist())
-                    )
+                    with full_precision(atom_feas.device):
+                        magmom = torch.abs(self.site_wise(atom_feas.float()))
+                    prediction["m"] = list(torch.split(magmom.view(-1), n_atoms))
 
         # Last conv layer
         atom_feas = self.atom_conv_layers[-1](
@@ -461,51 +771,106 @@ class CHGNet(nn.Module):
             atom_graph=g.batched_atom_graph,
             directed2undirected=g.directed2undirected,
         )
-        if self.readout_norm is not None:
-            atom_feas = self.readout_norm(atom_feas)
-
-        # Aggregate nodes and ReadOut
-        if self.mlp_first:
-            energies = self.mlp(atom_feas)
-            energy = self.pooling(energies, g.atom_owners).view(-1)
-            if return_site_energies:
-                prediction["site_energies"] = torch.split(
-                    energies.squeeze(1), atoms_per_graph.tolist()
-                )
-            if return_crystal_feas:
-                prediction["crystal_fea"] = self.pooling(atom_feas, g.atom_owners)
-        else:  # ave or attn to create crystal_fea first
-            crystal_feas = self.pooling(atom_feas, g.atom_owners)
-            energy = self.mlp(crystal_feas).view(-1) * atoms_per_graph
-            if return_crystal_feas:
-                prediction["crystal_fea"] = crystal_feas
-
-        # Compute force
-        if compute_force:
-            # Need to retain_graph here, because energy is used in loss function,
-            # so its gradient need to be calculated later
-            # The graphs of force and stress need to be created for same reason.
-            force = torch.autograd.grad(
-                energy.sum(), g.atom_positions, create_graph=True, retain_graph=True
-            )
-            prediction["f"] = [-1 * force_dim for force_dim in force]
-
-        # Compute stress
-        if compute_stress:
-            stress = torch.autograd.grad(
-                energy.sum(), g.strains, create_graph=True, retain_graph=True
-            )
-            # Convert Stress unit from eV/A^3 to GPa
-            scale = 1 / g.volumes * 160.21766208
-            stress = [i * j for i, j in zip(stress, scale)]
-            prediction["s"] = stress
+        # GraphPooling can reduce the sorted atoms segment by segment, which
+        # has no double backward for differentiating the forces again
+        pool_kwargs = (
+            {"atoms_per_graph": atoms_per_graph}
+            if isinstance(self.pooling, GraphPooling) and not create_graph
+            else {}
+        )
+        # Aggregate nodes and ReadOut in full precision
+        with full_precision(atom_feas.device):
+            atom_feas = atom_feas.float()
+            if self.readout_norm is not None:
+                atom_feas = self.readout_norm(atom_feas)
+
+            if self.mlp_first:
+                energies = self.mlp(atom_feas)
+                energy = self.pooling(energies, g.atom_owners, **pool_kwargs).view(-1)
+                if return_site_energies:
+                    prediction["site_energies"] = torch.split(
+                        energies.squeeze(1), n_atoms
+                    )
+                if return_crystal_feas:
+                    prediction["crystal_fea"] = self.pooling(
+                        atom_feas, g.atom_owners, **pool_kwargs
+                    )
+            else:  # ave or attn to create crystal_fea first
+                crystal_feas = self.pooling(atom_feas, g.atom_owners, **pool_kwargs)
+                energy = self.mlp(crystal_feas).view(-1) * atoms_per_graph
+                if return_crystal_feas:
+                    prediction["crystal_fea"] = crystal_feas
+        return prediction, energy
+
+    def _bond_ag_weight(self) -> Tensor:
+        """Stack the weights of bond_embedding and bond_weights_ag, which both
+        project the atom graph bond bases. Outside of training, when no gradient
+        of the weights is needed, the stack is cached, and rebuilt when either
+        weight is replaced or changed in place.
+        Under autocast the cached stack is kept in the autocast dtype, so the
+        matmul does not cast the weight again on every call.
 
-        # Normalize energy if model is intensive
-        if self.is_intensive:
-            energy = energy / atoms_per_graph
-        prediction["e"] = energy
+        Returns:
+            Tensor: the stacked weight [bond_fea_dim + atom_fea_dim, num_radial]
+        """
+        weights = (self.bond_embedding.weight, self.bond_weights_ag.weight)
+        needs_grad = torch.is_grad_enabled() and any(
+            weight.requires_grad for weight in weights
+        )
+        if self.training or needs_grad or torch.compiler.is_compiling():
+            # the cached stack is detached, backward has to reach the weights
+            return torch.cat(weights)
+        dtype = autocast_dtype(weights[0].device) or weights[0].dtype
+        key = (dtype, *((weight.data_ptr(), weight._version) for weight in weights))
+        if self._bond_ag_weight_cache is None or self._bond_ag_weight_cache[0] != key:
+            # not an inference tensor, so it can be reused by force predictions
+            with torch.inference_mode(mode=False), torch.no_grad():
+                self._bond_ag_weight_cache = (key, torch.cat(weights).to(dtype))
+        return self._bond_ag_weight_cache[1]
+
+    def compile_forward(
+        self,
+        mode: str | None = "reduce-overhead",
+        dynamic: bool = True,
+        compile_bases: bool = False,
+    ) -> None:
+        """Compile the message passing and readout of CHGNet with torch.compile,
+        which fuses the many small pointwise ops of the conv layers into fewer
+        kernels. Forces and stress are still taken with torch.autograd.grad
+        outside of the compiled region. Double backward through the compiled
+        region is not supported by torch.compile, so this is meant for inference.
 
-        return prediction
+        Args:
+            mode (str | None): the torch.compile mode.
+                Default = "reduce-overhead"
+            dynamic (bool): whether to compile with dynamic shapes, so batches
+                with different numbers of atoms and bonds do not recompile.
+                Default = True
+            compile_bases (bool): whether to also compile the bond and angle basis
+                expansions, which run while the graphs are batched and are not
+                part of the compiled message passing. The fused kernels round
+                differently, which shows most in the stress.
+                Default = False
+        """
+        self.__dict__.pop("_compute_energy", None)
+        self._compute_energy = torch.compile(
+            self._compute_energy, mode=mode, dynamic=dynamic, fullgraph=False
+        )
+        if compile_bases:
+            for expansion in (self.bond_basis_expansion, self.angle_basis_expansion):
+                if not isinstance(expansion, torch.jit.ScriptModule):
+                    expansion.compile(mode=mode, dynamic=dynamic)
+
+    def __getstate__(self) -> dict:
+        """Drop the torch.compile wrapper of compile_forward when the model is
+        pickled or deep-copied. It cannot be pickled and is bound to the original
+        model, so the copies run eagerly until compile_forward is called on them.
+        The pinned staging buffers are dropped too, copies allocate their own.
+        """
+        state = super().__getstate__()
+        state.pop("_compute_energy", None)
+        state["_pinned_staging"] = None
+        return state
 
     def predict_structure(
         self,
@@ -515,6 +880,7 @@ class CHGNet(nn.Module):
         return_atom_feas: bool = False,
         return_crystal_feas: bool = False,
         batch_size: int = 16,
+        precision: Literal["fp32", "bf16", "fp16"] = "fp32",
     ) -> dict[str, Tensor] | list[dict[str, Tensor]]:
         """Predict from pymatgen.core.Structure.
 
@@ -531,6 +897,9 @@ class CHGNet(nn.Module):
                 Default = False
             batch_size (int): batch_size for predict structures.
                 Default = 16
+            precision ('fp32' | 'bf16' | 'fp16'): precision of the message passing
+                layers, see message_passing_precision.
+                Default = 'fp32'
 
         Returns:
             prediction (dict): dict or list of dict containing the fields:
@@ -544,15 +913,30 @@ class CHGNet(nn.Module):
 
         structures = [structure] if isinstance(structure, Structure) else structure
 
-        graphs = [self.graph_converter(struct) for struct in structures]
-        return self.predict_graph(
-            graphs,
-            task=task,
-            return_site_energies=return_site_energies,
-            return_atom_feas=return_atom_feas,
-            return_crystal_feas=return_crystal_feas,
-            batch_size=batch_size,
-        )
+        model_device = next(self.parameters()).device
+        self.eval()
+        predictions: list[dict[str, Tensor]] = []
+        # the structures of the next batches are converted to graphs in a
+        # background thread while the current batch runs through the model
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            graph_batches = executor.map(
+                lambda batch: [self.graph_converter(struct) for struct in batch],
+                [
+                    structures[idx : idx + batch_size]
+                    for idx in range(0, len(structures), batch_size)
+                ],
+            )
+            for graphs in graph_batches:
+                predictions += self._predict_batch(
+                    graphs,
+                    task=task,
+                    return_site_energies=return_site_energies,
+                    return_atom_feas=return_atom_feas,
+                    return_crystal_feas=return_crystal_feas,
+                    model_device=model_device,
+                    precision=precision,
+                )
+        return predictions[0] if len(structures) == 1 else predictions
 
     def predict_graph(
         self,
@@ -562,6 +946,7 @@ class CHGNet(nn.Module):
         return_atom_feas: bool = False,
         return_crystal_feas: bool = False,
         batch_size: int = 16,
+        precision: Literal["fp32", "bf16", "fp16"] = "fp32",
     ) -> dict[str, Tensor] | list[dict[str, Tensor]]:
         """Predict from CrustalGraph.
 
@@ -577,6 +962,9 @@ class CHGNet(nn.Module):
                 Default = False
             batch_size (int): batch_size for predict structures.
                 Default = 16
+            precision ('fp32' | 'bf16' | 'fp16'): precision of the message passing
+                layers, see message_passing_precision.
+                Default = 'fp32'
 
         Returns:
             prediction (dict): dict or list of dict containing the fields:
@@ -594,20 +982,56 @@ class CHGNet(nn.Module):
 
         graphs = [graph] if isinstance(graph, CrystalGraph) else graph
         self.eval()
-        predictions: list[dict[str, Tensor]] = [{} for _ in range(len(graphs))]
+        predictions: list[dict[str, Tensor]] = []
         n_steps = math.ceil(len(graphs) / batch_size)
         for step in range(n_steps):
+            predictions += self._predict_batch(
+                graphs[batch_size * step : batch_size * (step + 1)],
+                task=task,
+                return_site_energies=return_site_energies,
+                return_atom_feas=return_atom_feas,
+                return_crystal_feas=return_crystal_feas,
+                model_device=model_device,
+                precision=precision,
+            )
+
+        return predictions[0] if len(graphs) == 1 else predictions
+
+    def _predict_batch(
+        self,
+        graphs: Sequence[CrystalGraph],
+        task: PredTask,
+        return_site_energies: bool,
+        return_atom_feas: bool,
+        return_crystal_feas: bool,
+        model_device: torch.device,
+        precision: Literal["fp32", "bf16", "fp16"],
+    ) -> list[dict[str, np.ndarray]]:
+        """Predict a single batch of graphs for predict_graph and predict_structure.
+
+        Returns:
+            list[dict[str, np.ndarray]]: the predictions of each graph
+        """
+        on_cpu = all(g.atomic_number.device.type == "cpu" for g in graphs)
+        if model_device.type == "cuda" and on_cpu:
+            if self._pinned_staging is None:
+                self._pinned_staging = _PinnedStaging()
+            graphs = self._pinned_staging.to(graphs, model_device)
+        else:
+            graphs = [g.to(model_device) for g in graphs]
+        grad_mode = prediction_grad_mode(task)
+        with grad_mode, message_passing_precision(model_device, precision):
             prediction = self.forward(
-                [
-                    g.to(model_device)
-                    for g in graphs[batch_size * step : batch_size * (step + 1)]
-                ],
+                graphs,
                 task=task,
                 return_site_energies=return_site_energies,
                 return_atom_feas=return_atom_feas,
                 return_crystal_feas=return_crystal_feas,
+                create_graph=False,
             )
-            for key in {
+        keys = [
+            key
+            for key in (
                 "e",
                 "f",
                 "s",
@@ -615,13 +1039,70 @@ class CHGNet(nn.Module):
                 "site_energies",
                 "atom_fea",
                 "crystal_fea",
-            } & {*prediction}:
-                for idx, tensor in enumerate(prediction[key]):
-                    predictions[step * batch_size + idx][key] = (
-                        tensor.cpu().detach().numpy()
-                    )
+            )
+            if key in prediction
+        ]
+        # all outputs of the batch are copied to the host together
+        arrays = iter(
+            _split_to_numpy([tensor for key in keys for tensor in prediction[key]])
+        )
+        predictions: list[dict[str, np.ndarray]] = [{} for _ in range(len(graphs))]
+        for key in keys:
+            for pred in predictions:
+                pred[key] = next(arrays)
+        return predictions
 
-        return predictions[0] if len(graphs) == 1 else predictions
+    def predict_tensors(
+        self,
+        graph: CrystalGraph,
+        task: PredTask = "efsm",
+        return_site_energies: bool = False,
+        return_atom_feas: bool = False,
+        return_crystal_feas: bool = False,
+    ) -> dict[str, Tensor]:
+        """Predict a single CrystalGraph and keep the results as tensors.
+
+        Unlike predict_graph, the outputs are neither moved to cpu nor converted
+        to numpy, so the graph is expected to already be on the model device.
+
+        Args:
+            graph (CrystalGraph): CrystalGraph to predict.
+            task (str): can be 'e' 'ef', 'em', 'efs', 'efsm'
+                Default = "efsm"
+            return_site_energies (bool): whether to return per-site energies.
+                Default = False
+            return_atom_feas (bool): whether to return atom features.
+                Default = False
+            return_crystal_feas (bool): whether to return crystal features.
+                Default = False
+
+        Returns:
+            prediction (dict): dict of detached tensors on the model device with
+                the same fields as predict_graph
+        """
+        self.eval()
+        with prediction_grad_mode(task):
+            prediction = self.forward(
+                [graph],
+                task=task,
+                return_site_energies=return_site_energies,
+                return_atom_feas=return_atom_feas,
+                return_crystal_feas=return_crystal_feas,
+                create_graph=False,
+            )
+        return {
+            key: prediction[key][0].detach()
+            for key in {
+                "e",
+                "f",
+                "s",
+                "m",
+                "site_energies",
+                "atom_fea",
+                "crystal_fea",
+            }
+            & {*prediction}
+        }
 
     def as_dict(self):
         """Return the CHGNet weights and args in a dictionary."""
@@ -680,13 +1161,17 @@ class BatchedGraph:
         directed2undirected (Tensor): the utility tensor used to quickly
             map directed edges to undirected edges in graph
             [num_directed]
-        atom_positions (list[Tensor]): cartesian coordinates of the atoms
+        atom_positions (Tensor): cartesian coordinates of the atoms
             from structures
-            [[num_atoms_1, 3], [num_atoms_2, 3], ...]
-        strains (list[Tensor]): a list of strains that's initialized to be zeros
-            [[3, 3], [3, 3], ...]
+            [num_batch_atoms, 3]
+        strains (Tensor | None): strains of the lattices initialized to be zeros,
+            None if stress is not computed
+            [batch_size, 3, 3]
         volumes (Tensor): the volume of each structure in the batch
             [batch_size]
+        atoms_per_graph (Tensor): the number of atoms of each structure
+            [batch_size]
+        n_atoms (list[int]): host-side copy of atoms_per_graph
     """
 
     atomic_numbers: Tensor
@@ -697,9 +1182,11 @@ class BatchedGraph:
     batched_bond_graph: Tensor
     atom_owners: Tensor
     directed2undirected: Tensor
-    atom_positions: Sequence[Tensor]
-    strains: Sequence[Tensor]
-    volumes: Sequence[Tensor]
+    atom_positions: Tensor
+    strains: Tensor | None
+    volumes: Tensor
+    atoms_per_graph: Tensor
+    n_atoms: list[int]
 
     @classmethod
     def from_graphs(
@@ -708,6 +1195,7 @@ class BatchedGraph:
         bond_basis_expansion: nn.Module,
         angle_basis_expansion: nn.Module,
         compute_stress: bool = False,
+        basis_dtype: torch.dtype | None = None,
     ) -> BatchedGraph:
         """Featurize and assemble a list of graphs.
 
@@ -716,92 +1204,174 @@ class BatchedGraph:
             bond_basis_expansion (nn.Module): bond basis expansion layer in CHGNet
             angle_basis_expansion (nn.Module): angle basis expansion layer in CHGNet
             compute_stress (bool): whether to compute stress. Default = False
+            basis_dtype (torch.dtype, optional): dtype to store the bond and angle
+                bases in, e.g. torch.bfloat16 to halve their memory traffic when
+                the model runs under autocast. The bases are still expanded in
+                fp32, and the geometry and indices keep their dtypes.
+                Default = None, which keeps the bases in fp32
 
         Returns:
             assembled batch_graph that is ready for batched forward pass in CHGNet
         """
-        atomic_numbers, atom_positions = [], []
-        strains, volumes = [], []
-        bond_bases_ag, bond_bases_bg, angle_bases = [], [], []
-        batched_atom_graph, batched_bond_graph = [], []
-        directed2undirected = []
-        atom_owners = []
-        atom_offset_idx = 0
-        n_undirected = 0
-
-        for graph_idx, graph in enumerate(graphs):
-            # Atoms
-            n_atom = graph.atomic_number.shape[0]
-            atomic_numbers.append(graph.atomic_number)
-
-            # Lattice
-            if compute_stress:
-                strain = graph.lattice.new_zeros([3, 3], requires_grad=True)
-                lattice = graph.lattice @ (torch.eye(3).to(strain.device) + strain)
-            else:
-                strain = None
-                lattice = graph.lattice
-            volumes.append(torch.dot(lattice[0], torch.cross(lattice[1], lattice[2])))
-            strains.append(strain)
-
-            # Bonds
-            atom_cart_coords = graph.atom_frac_coord @ lattice
-            bond_basis_ag, bond_basis_bg, bond_vectors = bond_basis_expansion(
-                center=atom_cart_coords[graph.atom_graph[:, 0]],
-                neighbor=atom_cart_coords[graph.atom_graph[:, 1]],
-                undirected2directed=graph.undirected2directed,
-                image=graph.neighbor_image,
-                lattice=lattice,
+        batched_graph = (
+            cls._from_many_graphs(
+                graphs, bond_basis_expansion, angle_basis_expansion, compute_stress
             )
-            atom_positions.append(atom_cart_coords)
-            bond_bases_ag.append(bond_basis_ag)
-            bond_bases_bg.append(bond_basis_bg)
-
-            # Indexes
-            batched_atom_graph.append(graph.atom_graph + atom_offset_idx)
-            directed2undirected.append(graph.directed2undirected + n_undirected)
-
-            # Angles
-            # Here we use directed edges to calculate angles, and
-            # keep only the undirected graph index in the bond_graph,
-            # So the number of columns in bond_graph reduce from 5 to 3
-            if len(graph.bond_graph) != 0:
-                bond_vecs_i = torch.index_select(
-                    bond_vectors, 0, graph.bond_graph[:, 2]
-                )
-                bond_vecs_j = torch.index_select(
-                    bond_vectors, 0, graph.bond_graph[:, 4]
-                )
-                angle_basis = angle_basis_expansion(bond_vecs_i, bond_vecs_j)
-                angle_bases.append(angle_basis)
-
-                bond_graph = graph.bond_graph.new_zeros([graph.bond_graph.shape[0], 3])
-                bond_graph[:, 0] = graph.bond_graph[:, 0] + atom_offset_idx
-                bond_graph[:, 1] = graph.bond_graph[:, 1] + n_undirected
-                bond_graph[:, 2] = graph.bond_graph[:, 3] + n_undirected
-                batched_bond_graph.append(bond_graph)
-
-            atom_owners.append(torch.ones(n_atom, requires_grad=False) * graph_idx)
-            atom_offset_idx += n_atom
-            n_undirected += len(bond_basis_ag)
-
-        # Make Torch Tensors
-        atomic_numbers = torch.cat(atomic_numbers, dim=0)
-        bond_bases_ag = torch.cat(bond_bases_ag, dim=0)
-        bond_bases_bg = torch.cat(bond_bases_bg, dim=0)
-        angle_bases = (
-            torch.cat(angle_bases, dim=0) if len(angle_bases) != 0 else torch.tensor([])
+            if len(graphs) > 1
+            else cls._from_single_graph(
+                graphs[0], bond_basis_expansion, angle_basis_expansion, compute_stress
+            )
+        )
+        if basis_dtype is not None:
+            batched_graph.bond_bases_ag = batched_graph.bond_bases_ag.to(basis_dtype)
+            batched_graph.bond_bases_bg = batched_graph.bond_bases_bg.to(basis_dtype)
+            batched_graph.angle_bases = batched_graph.angle_bases.to(basis_dtype)
+        return batched_graph
+
+    @classmethod
+    def _from_single_graph(
+        cls,
+        graph: CrystalGraph,
+        bond_basis_expansion: nn.Module,
+        angle_basis_expansion: nn.Module,
+        compute_stress: bool,
+    ) -> BatchedGraph:
+        """Featurize a single graph, used by from_graphs for batches of one.
+        The graph needs no index offsets, so its tensors are used as is, CHGNet
+        only reads them. See from_graphs for the arguments.
+        """
+        n_atom = len(graph.atomic_number)
+
+        # Lattice
+        # The strains and positions are single tensors, so forces and stress
+        # are taken w.r.t. one input each
+        lattices, strains, volumes = _strained_lattices([graph], compute_stress)
+        atom_positions = graph.atom_frac_coord @ lattices[0]
+
+        # Bonds
+        bond_bases_ag, bond_bases_bg, bond_vectors = bond_basis_expansion(
+            center=atom_positions[graph.atom_graph[:, 0]],
+            neighbor=atom_positions[graph.atom_graph[:, 1]],
+            undirected2directed=graph.undirected2directed,
+            image=graph.neighbor_image,
+            lattice=lattices[0],
+        )
+
+        # Angles
+        # Here we use directed edges to calculate angles, and
+        # keep only the undirected graph index in the bond_graph,
+        # So the number of columns in bond_graph reduce from 5 to 3
+        # Graphs without angles have a [0] bond_graph, which is viewed as
+        # [0, 5] so that they take the same path with zero rows
+        bond_graph = graph.bond_graph.view(-1, 5)
+        # both bonds of each angle are read in a single gather
+        bond_vecs_i, bond_vecs_j = bond_vectors[bond_graph[:, [2, 4]]].unbind(1)
+        angle_bases = angle_basis_expansion(bond_vecs_i, bond_vecs_j)
+
+        device = graph.atomic_number.device
+        return cls(
+            atomic_numbers=graph.atomic_number,
+            bond_bases_ag=bond_bases_ag,
+            bond_bases_bg=bond_bases_bg,
+            angle_bases=angle_bases,
+            batched_atom_graph=graph.atom_graph,
+            batched_bond_graph=bond_graph[:, [0, 1, 3]],
+            atom_owners=torch.zeros(n_atom, dtype=torch.int32, device=device),
+            directed2undirected=graph.directed2undirected,
+            atom_positions=atom_positions,
+            strains=strains,
+            volumes=volumes,
+            atoms_per_graph=torch.full((1,), n_atom, dtype=torch.long, device=device),
+            n_atoms=[n_atom],
+        )
+
+    @classmethod
+    def _from_many_graphs(
+        cls,
+        graphs: Sequence[CrystalGraph],
+        bond_basis_expansion: nn.Module,
+        angle_basis_expansion: nn.Module,
+        compute_stress: bool,
+    ) -> BatchedGraph:
+        """Featurize and assemble several graphs at once. The index offsets are
+        added to the concatenated graphs in one go, and the bond and angle bases
+        are expanded once for the whole batch instead of once per graph.
+
+        Args:
+            graphs (list[Tensor]): a list of CrystalGraphs
+            bond_basis_expansion (nn.Module): bond basis expansion layer in CHGNet
+            angle_basis_expansion (nn.Module): angle basis expansion layer in CHGNet
+            compute_stress (bool): whether to compute stress
+
+        Returns:
+            assembled batch_graph that is ready for batched forward pass in CHGNet
+        """
+        device = graphs[0].atomic_number.device
+        n_atoms = [len(graph.atomic_number) for graph in graphs]
+        n_directed = [len(graph.atom_graph) for graph in graphs]
+        n_undirected = [len(graph.undirected2directed) for graph in graphs]
+        n_angles = [len(graph.bond_graph) for graph in graphs]
+        # the sizes of all graphs are moved to the device in a single copy, and
+        # the start of each graph in every batched tensor derived from them
+        sizes = torch.tensor([n_atoms, n_directed, n_undirected, n_angles]).to(device)
+        atoms_per_graph, directed_per_graph, undirected_per_graph, angles_per_graph = (
+            sizes
+        )
+        atom_starts, directed_starts, undirected_starts, _ = sizes.cumsum(1) - sizes
+        total_directed, total_undirected = sum(n_directed), sum(n_undirected)
+        total_angles = sum(n_angles)
+        # int32 like the atom_owners of from_graphs, so no cast is needed later
+        graph_idx = torch.arange(len(graphs), dtype=torch.int32, device=device)
+
+        # Lattice
+        lattices, strains, volumes = _strained_lattices(graphs, compute_stress)
+
+        # Atoms
+        atomic_numbers = torch.cat([graph.atomic_number for graph in graphs])
+        atom_owners = _graph_offsets(graph_idx, atoms_per_graph, len(atomic_numbers))
+        frac_coords = torch.cat([graph.atom_frac_coord for graph in graphs])
+        atom_positions = (frac_coords[:, None] @ lattices[atom_owners]).squeeze(1)
+
+        # Bonds
+        # torch.cat allocates each batched field once at its full size, and the
+        # offsets are added in place so no second copy of the field is made
+        batched_atom_graph = torch.cat([graph.atom_graph for graph in graphs])
+        batched_atom_graph += _graph_offsets(
+            atom_starts, directed_per_graph, total_directed
+        )[:, None]
+        directed2undirected = torch.cat([graph.directed2undirected for graph in graphs])
+        directed2undirected += _graph_offsets(
+            undirected_starts, directed_per_graph, total_directed
+        )
+        undirected2directed = torch.cat([graph.undirected2directed for graph in graphs])
+        undirected2directed += _graph_offsets(
+            directed_starts, undirected_per_graph, total_undirected
+        )
+        bond_owners = _graph_offsets(graph_idx, directed_per_graph, total_directed)
+        bond_bases_ag, bond_bases_bg, bond_vectors = bond_basis_expansion(
+            center=atom_positions[batched_atom_graph[:, 0]],
+            neighbor=atom_positions[batched_atom_graph[:, 1]],
+            undirected2directed=undirected2directed,
+            image=torch.cat([graph.neighbor_image for graph in graphs]),
+            lattice=lattices[bond_owners],
+        )
+
+        # Angles
+        # Same as in _from_single_graph, the bond_graph keeps only the undirected
+        # indices and graphs without angles contribute zero rows
+        bond_graph = torch.cat([graph.bond_graph.view(-1, 5) for graph in graphs])
+        directed_offsets = _graph_offsets(
+            directed_starts, angles_per_graph, total_angles
         )
-        batched_atom_graph = torch.cat(batched_atom_graph, dim=0)
-        if batched_bond_graph != []:
-            batched_bond_graph = torch.cat(batched_bond_graph, dim=0)
-        else:  # when bond graph is empty or disabled
-            batched_bond_graph = torch.tensor([])
-        atom_owners = (
-            torch.cat(atom_owners, dim=0).type(torch.int32).to(atomic_numbers.device)
+        bond_pairs = bond_graph[:, [2, 4]] + directed_offsets[:, None]
+        angle_bases = angle_basis_expansion(*bond_vectors[bond_pairs].unbind(1))
+        batched_bond_graph = bond_graph[:, [0, 1, 3]]
+        batched_bond_graph[:, 0] += _graph_offsets(
+            atom_starts, angles_per_graph, total_angles
         )
-        directed2undirected = torch.cat(directed2undirected, dim=0)
-        volumes = torch.tensor(volumes, dtype=datatype, device=atomic_numbers.device)
+        batched_bond_graph[:, 1:] += _graph_offsets(
+            undirected_starts, angles_per_graph, total_angles
+        )[:, None]
 
         return cls(
             atomic_numbers=atomic_numbers,
@@ -815,4 +1385,6 @@ class BatchedGraph:
             atom_positions=atom_positions,
             strains=strains,
             volumes=volumes,
+            atoms_per_graph=atoms_per_graph,
+            n_atoms=n_atoms,
         )
@@ -3,10 +3,12 @@ from __future__ import annotations
 from time import perf_counter
 
 import numpy as np
+import pytest
+import torch
 from pymatgen.core import Structure
 
 from chgnet import ROOT
-from chgnet.graph import CrystalGraphConverter
+from chgnet.graph import CrystalGraphConverter, radius_graph_pbc_torch
 
 np.random.seed(0)
 
@@ -349,3 +351,62 @@ def test_crystal_graph_repr():
         == "CrystalGraph(composition='Li2 Mn2 O4', atom_graph_cutoff=5, bond_graph_cutoff=3, "
         "n_atoms=8, atom_graph_len=384, bond_graph_len=744)"
     )
+
+
+def test_crystal_graph_convert_arrays():
+    graph = converter_fast(structure)
+    array_graph = converter_fast.convert_arrays(
+        atomic_numbers=structure.atomic_numbers,
+        cart_coords=structure.cart_coords,
+        lattice=structure.lattice.matrix,
+        composition=structure.composition.formula,
+    )
+    assert repr(array_graph) == repr(graph)
+    assert array_graph.atom_frac_coord.requires_grad
+    assert np.allclose(
+        array_graph.atom_frac_coord.detach(), graph.atom_frac_coord.detach(), atol=1e-6
+    )
+    assert (array_graph.atom_graph == graph.atom_graph).all()
+    assert (array_graph.bond_graph == graph.bond_graph).all()
+    assert (array_graph.neighbor_image == graph.neighbor_image).all()
+
+
+def test_crystal_graph_sorted_by_owner():
+    cart_coords = structure.cart_coords
+    lattice = structure.lattice.matrix
+    neighbor_list = converter_fast.find_neighbors(cart_coords, lattice, True, 5)
+    shuffle = np.random.permutation(len(neighbor_list[0]))
+    graph = converter_fast.convert_arrays(
+        atomic_numbers=structure.atomic_numbers,
+        cart_coords=cart_coords,
+        lattice=lattice,
+        neighbor_list=tuple(arr[shuffle] for arr in neighbor_list),
+    )
+    # CHGNet aggregates bond and angle messages by segments of sorted owners
+    assert (graph.atom_graph[1:, 0] >= graph.atom_graph[:-1, 0]).all()
+    assert (graph.bond_graph[1:, 1] >= graph.bond_graph[:-1, 1]).all()
+    assert len(graph.atom_graph) == len(converter_fast(structure).atom_graph)
+
+
+@pytest.mark.parametrize("pbc", [True, (True, False, True)])
+def test_radius_graph_pbc_torch(pbc):
+    # unwrapped positions, as in MD trajectories
+    cart_coords = structure.cart_coords + 1.5 * structure.lattice.matrix[0]
+    lattice = structure.lattice.matrix
+    ref = CrystalGraphConverter.find_neighbors(cart_coords, lattice, pbc, cutoff=5)
+    out = radius_graph_pbc_torch(
+        torch.tensor(cart_coords), torch.tensor(lattice), cutoff=5, pbc=pbc
+    )
+
+    def pairs(center_index, neighbor_index, image, distance):
+        return sorted(
+            zip(
+                np.asarray(center_index).tolist(),
+                np.asarray(neighbor_index).tolist(),
+                np.asarray(image).astype(int).tolist(),
+                np.asarray(distance).round(5).tolist(),
+            )
+        )
+
+    assert pairs(*out) == pairs(*ref)
+    assert (out[0][1:] >= out[0][:-1]).all()
@@ -96,3 +96,43 @@ def test_bond_encoder_zero_bond_length() -> None:
 
     for tensor in (bond_basis_ag, bond_basis_bg, bond_vectors):
         assert tensor.isnan().all()
+
+
+def test_bond_encoder_per_bond_lattice() -> None:
+    undirected2directed = torch.tensor([0, 1])
+    image = torch.tensor([[0.0, 0, 1], [1, 0, 0]])
+    lattice = torch.tensor([[3.0, 0, 0], [0, 4, 0], [1, 0, 5]])
+
+    bond_encoder = BondEncoder()
+    expected = bond_encoder(center, neighbor, undirected2directed, image, lattice)
+    per_bond = bond_encoder(
+        center, neighbor, undirected2directed, image, lattice.expand(2, 3, 3)
+    )
+    for tensor, expected_tensor in zip(per_bond, expected):
+        assert torch.allclose(tensor, expected_tensor)
+
+
+@pytest.mark.parametrize("cutoff_coeff", [5, None])
+def test_bond_encoder_matches_radial_bessel(cutoff_coeff: int | None) -> None:
+    bond_encoder = BondEncoder(cutoff_coeff=cutoff_coeff)
+    center, neighbor = torch.rand(10, 3) * 4, torch.rand(10, 3) * 4
+    bond_basis_ag, bond_basis_bg, _ = bond_encoder(
+        center, neighbor, torch.arange(10), torch.zeros(10, 3), torch.eye(3)
+    )
+    bond_lengths = torch.norm(neighbor - center, dim=1)
+    assert torch.equal(bond_basis_ag, bond_encoder.rbf_expansion_ag(bond_lengths))
+    assert torch.equal(bond_basis_bg, bond_encoder.rbf_expansion_bg(bond_lengths))
+
+
+@pytest.mark.parametrize("order", [1, 4, 10])
+def test_fourier_from_cos(order: int) -> None:
+    fourier = Fourier(order=order)
+    cos = torch.linspace(-1, 1, 101, dtype=torch.float64) * (1 - 1e-6)
+    cos.requires_grad_(True)
+    expected = fourier.double()(torch.acos(cos))
+    result = fourier.forward_from_cos(cos)
+    assert torch.allclose(result, expected, atol=1e-10)
+
+    (grad,) = torch.autograd.grad(result.sum(), cos)
+    (expected_grad,) = torch.autograd.grad(expected.sum(), cos)
+    assert torch.allclose(grad, expected_grad, rtol=1e-6)
@@ -6,6 +6,7 @@ from typing import TYPE_CHECKING, Literal
 
 import numpy as np
 import pytest
+import torch
 from ase import Atoms
 from ase.md.npt import NPT
 from ase.md.nptberendsen import Inhomogeneous_NPTBerendsen
@@ -20,7 +21,12 @@ from pytest import MonkeyPatch, approx
 from chgnet import ROOT
 from chgnet.graph import CrystalGraphConverter
 from chgnet.model import StructOptimizer
-from chgnet.model.dynamics import CHGNetCalculator, EquationOfState, MolecularDynamics
+from chgnet.model.dynamics import (
+    CHGNetCalculator,
+    EquationOfState,
+    MolecularDynamics,
+    aot_compile_calculator,
+)
 from chgnet.model.model import CHGNet
 
 if TYPE_CHECKING:
@@ -300,3 +306,238 @@ def test_md_crystal_feas_log(
     assert crystal_feas[0][1] == approx(2.652704, rel=1e-5)
     assert crystal_feas[10][0] == approx(1.4390125, rel=1e-5)
     assert crystal_feas[10][1] == approx(2.6525214, rel=1e-5)
+
+
+def test_calculator_reuses_cached_structure():
+    atoms = AseAtomsAdaptor.get_atoms(structure)
+    calculator = CHGNetCalculator(model=chgnet)
+    atoms.calc = calculator
+    atoms.get_potential_energy()
+    cached_structure = calculator._cached_structure
+
+    atoms.rattle(stdev=0.05, seed=0)
+    atoms.set_cell(atoms.get_cell()[:] * 1.01, scale_atoms=True)
+    energy = atoms.get_potential_energy()
+    assert calculator._cached_structure is cached_structure
+
+    fresh_atoms = atoms.copy()
+    fresh_atoms.calc = CHGNetCalculator(model=chgnet)
+    assert energy == approx(fresh_atoms.get_potential_energy(), rel=1e-6)
+    assert_allclose(atoms.get_forces(), fresh_atoms.get_forces(), atol=1e-6)
+    assert_allclose(atoms.get_stress(), fresh_atoms.get_stress(), atol=1e-6)
+
+
+def test_calculator_direct_graph():
+    atoms = AseAtomsAdaptor.get_atoms(structure)
+    atoms.rattle(stdev=0.05, seed=0)
+    atoms.calc = CHGNetCalculator(model=chgnet, direct=True)
+    energy = atoms.get_potential_energy()
+
+    ref_atoms = atoms.copy()
+    ref_atoms.calc = CHGNetCalculator(model=chgnet)
+    assert energy == approx(ref_atoms.get_potential_energy(), rel=1e-6)
+    assert_allclose(atoms.get_forces(), ref_atoms.get_forces(), atol=1e-6)
+    assert_allclose(atoms.get_stress(), ref_atoms.get_stress(), atol=1e-6)
+    assert_allclose(atoms.get_magnetic_moments(), ref_atoms.get_magnetic_moments())
+
+
+def test_calculator_skin_reuses_neighbors():
+    atoms = AseAtomsAdaptor.get_atoms(structure)
+    atoms.calc = CHGNetCalculator(model=chgnet, direct=True, skin=1)
+    ref_atoms = atoms.copy()
+    ref_atoms.calc = CHGNetCalculator(model=chgnet, direct=True)
+
+    candidates = None
+    for seed in range(3):
+        for _atoms in (atoms, ref_atoms):
+            _atoms.rattle(stdev=0.05, seed=seed)
+        # same pairs in a different order, so only equal up to fp32 summation
+        assert_allclose(atoms.get_forces(), ref_atoms.get_forces(), atol=1e-5)
+        assert atoms.get_potential_energy() == approx(
+            ref_atoms.get_potential_energy(), rel=1e-6
+        )
+        cache = atoms.calc._neighbor_cache
+        # small displacements keep the candidates of the first search
+        assert candidates is None or cache["candidates"] is candidates
+        candidates = cache["candidates"]
+
+    # moving an atom by more than half the skin triggers a new search
+    atoms.positions[0] += [0.6, 0, 0]
+    atoms.get_potential_energy()
+    assert atoms.calc._neighbor_cache["candidates"] is not candidates
+
+
+@pytest.mark.parametrize("skin", [0, 1])
+def test_calculator_gpu_graph(skin: float):
+    atoms = AseAtomsAdaptor.get_atoms(structure)
+    atoms.rattle(stdev=0.05, seed=0)
+    atoms.calc = CHGNetCalculator(
+        model=chgnet, direct=True, use_gpu_graph=True, skin=skin
+    )
+    ref_atoms = atoms.copy()
+    ref_atoms.calc = CHGNetCalculator(model=chgnet, direct=True)
+    assert atoms.get_potential_energy() == approx(
+        ref_atoms.get_potential_energy(), rel=1e-6
+    )
+    assert_allclose(atoms.get_forces(), ref_atoms.get_forces(), atol=1e-5)
+    assert_allclose(atoms.get_stress(), ref_atoms.get_stress(), atol=1e-5)
+
+
+def test_calculator_compile_cpu_runs_eagerly(capsys: pytest.CaptureFixture):
+    calculator = CHGNetCalculator(model=chgnet, use_device="cpu", compile=True)
+    assert "torch.compile is only used on cuda" in capsys.readouterr().out
+    assert calculator._compiled_compute is None
+
+    atoms = AseAtomsAdaptor.get_atoms(structure)
+    atoms.calc = calculator
+    for _ in range(calculator.compile_warmup_steps + 1):
+        atoms.rattle(stdev=0.01, seed=0)
+        atoms.get_potential_energy()
+    assert "_compute_energy" not in vars(chgnet)
+
+
+def test_calculator_compile_leaves_model_unchanged():
+    calculator = CHGNetCalculator(model=chgnet, use_device="cpu")
+    eager_compute = chgnet._compute_energy
+    calls = []
+
+    def compiled_compute(*args, **kwargs):
+        # stands in for torch.compile, which only runs on cuda
+        assert vars(chgnet)["_compute_energy"] is compiled_compute
+        assert torch.get_float32_matmul_precision() == "high"
+        calls.append(1)
+        return eager_compute(*args, **kwargs)
+
+    calculator._compiled_compute = compiled_compute
+    atoms = AseAtomsAdaptor.get_atoms(structure)
+    atoms.calc = calculator
+    for _ in range(calculator.compile_warmup_steps + 2):
+        atoms.rattle(stdev=0.01, seed=0)
+        atoms.get_potential_energy()
+        assert "_compute_energy" not in vars(chgnet)
+        assert torch.get_float32_matmul_precision() == "highest"
+    assert len(calls) == 2
+
+    # other users of the shared model still run eagerly
+    chgnet.predict_structure(structure)
+    assert len(calls) == 2
+
+
+def test_md_cuda_graph_cpu_runs_eagerly():
+    md = MolecularDynamics(
+        atoms=structure,
+        model=chgnet,
+        ensemble="nve",
+        timestep=1,  # in fs
+        use_device="cpu",
+        use_cuda_graph=True,
+    )
+    assert md.atoms.calc.use_cuda_graph is False
+    md.run(5)
+    assert len(md.atoms.calc._cuda_graphs) == 0
+
+
+def test_md_set_atoms_resets_compile_cache():
+    md = MolecularDynamics(
+        atoms=structure,
+        model=chgnet,
+        ensemble="nve",
+        timestep=1,  # in fs
+        use_device="cpu",
+    )
+    calculator = md.atoms.calc
+    md.run(2)
+    assert calculator._n_calculations > 0
+
+    # same number of atoms keeps the warmup and bucket state
+    md.set_atoms(AseAtomsAdaptor.get_atoms(structure))
+    assert calculator._n_calculations > 0
+
+    md.set_atoms(AseAtomsAdaptor.get_atoms(structure * [2, 1, 1]))
+    assert md.atoms.calc is calculator
+    assert calculator._n_calculations == 0
+    assert calculator._edge_bucket is None
+    md.run(2)
+    assert "_compute_energy" not in vars(chgnet)
+
+
+def test_calculator_pad_edges():
+    atoms = AseAtomsAdaptor.get_atoms(structure)
+    calculator = CHGNetCalculator(model=chgnet, pad_edges=True)
+    atoms.calc = calculator
+    ref_calculator = CHGNetCalculator(model=chgnet)
+
+    for seed in range(2):
+        atoms.rattle(stdev=0.05, seed=seed)
+        energy = atoms.get_potential_energy()
+        assert all(
+            size % calculator.edge_bucket_size == 0
+            for size in calculator._edge_bucket[1:]
+        )
+
+        ref_atoms = atoms.copy()
+        ref_atoms.calc = ref_calculator
+        assert energy == approx(ref_atoms.get_potential_energy(), rel=1e-6)
+        assert_allclose(atoms.get_forces(), ref_atoms.get_forces(), atol=1e-6)
+        assert_allclose(atoms.get_stress(), ref_atoms.get_stress(), atol=1e-6)
+        assert_allclose(
+            atoms.get_magnetic_moments(), ref_atoms.get_magnetic_moments(), atol=1e-6
+        )
+
+    # padding keeps bonds and angles sorted by owner
+    graph = calculator._pad_graph(chgnet.graph_converter(structure), atoms.cell.array)
+    assert (graph.atom_graph[1:, 0] >= graph.atom_graph[:-1, 0]).all()
+    assert (graph.bond_graph[1:, 1] >= graph.bond_graph[:-1, 1]).all()
+
+    # directed bonds stay twice the undirected ones for any bond count
+    for supercell in ([2, 1, 1], [3, 1, 1]):
+        supercell = structure * supercell
+        graph = calculator._pad_graph(
+            chgnet.graph_converter(supercell), supercell.lattice.matrix
+        )
+        assert len(graph.atom_graph) == 2 * len(graph.undirected2directed)
+
+
+def test_aot_compile_calculator(tmp_path, capsys: pytest.CaptureFixture):
+    model_path = aot_compile_calculator(
+        chgnet, structure, f"{tmp_path}/chgnet.pt2", use_device="cpu"
+    )
+    atoms = AseAtomsAdaptor.get_atoms(structure)
+    calculator = CHGNetCalculator(model=chgnet, use_device="cpu", model_path=model_path)
+    atoms.calc = calculator
+    ref_atoms = atoms.copy()
+    ref_atoms.calc = CHGNetCalculator(model=chgnet, use_device="cpu")
+
+    for seed in range(2):
+        for _atoms in (atoms, ref_atoms):
+            _atoms.rattle(stdev=0.05, seed=seed)
+        # inductor fuses and reorders the fp32 arithmetic
+        assert atoms.get_potential_energy() == approx(
+            ref_atoms.get_potential_energy(), rel=1e-6
+        )
+        assert_allclose(atoms.get_forces(), ref_atoms.get_forces(), atol=1e-4)
+        assert_allclose(atoms.get_stress(), ref_atoms.get_stress(), atol=1e-4)
+    assert calculator._aot_model is not None
+
+    # other systems fall back to the eager model
+    supercell = AseAtomsAdaptor.get_atoms(structure * [2, 1, 1])
+    supercell.calc = calculator
+    supercell.get_potential_energy()
+    assert "CHGNet runs eagerly" in capsys.readouterr().out
+    assert calculator._aot_model is None
+
+
+def test_calculator_bf16_precision():
+    atoms = AseAtomsAdaptor.get_atoms(structure)
+    atoms.rattle(stdev=0.05, seed=0)
+    atoms.calc = CHGNetCalculator(model=chgnet, use_device="cpu", precision="bf16")
+    energy = atoms.get_potential_energy()
+    assert atoms.get_forces().dtype == np.float32
+
+    ref_atoms = atoms.copy()
+    ref_atoms.calc = CHGNetCalculator(model=chgnet, use_device="cpu")
+    assert energy == approx(ref_atoms.get_potential_energy(), abs=0.01 * len(atoms))
+    assert_allclose(atoms.get_forces(), ref_atoms.get_forces(), atol=0.1)
+
+    with pytest.raises(ValueError, match="precision='fp8' must be one of"):
+        CHGNetCalculator(model=chgnet, precision="fp8")
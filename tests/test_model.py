@@ -1,13 +1,19 @@
 from __future__ import annotations
 
+import copy
+import pickle
+
 import numpy as np
 import pytest
+import torch
 from pymatgen.core import Structure
 from pytest import mark
 
 from chgnet import ROOT
 from chgnet.graph import CrystalGraphConverter
-from chgnet.model.model import CHGNet
+from chgnet.model import functions
+from chgnet.model.layers import GraphPooling
+from chgnet.model.model import BatchedGraph, CHGNet
 
 structure = Structure.from_file(f"{ROOT}/examples/mp-18767-LiMnO2.cif")
 graph = CrystalGraphConverter()(structure, graph_id="test-model")
@@ -41,6 +47,7 @@ def test_model(
         n_conv=n_conv,
         composition_model=composition_model,
         converter_verbose=converter_verbose,
+        verbose=True,
     )
     out = model([graph])
     assert list(out) == ["atoms_per_graph", "e"]
@@ -225,3 +232,267 @@ def test_as_to_from_dict() -> None:
 
     model_3 = CHGNet(**to_dict["model_args"])
     assert model_3.todict() == to_dict
+
+
+def test_force_graph_created_unless_disabled():
+    # eval mode still differentiates forces, e.g. for force losses or Hessians
+    for training in (True, False):
+        model.train(training)
+        prediction = model([graph], task="efs")
+        assert prediction["f"][0].requires_grad
+        assert prediction["s"][0].requires_grad
+    model.eval()
+    prediction = model([graph], task="efs", create_graph=False)
+    assert not prediction["f"][0].requires_grad
+    assert not prediction["s"][0].requires_grad
+
+    # the eval mode forces have a second derivative w.r.t. the weights
+    chgnet = CHGNet.from_dict(model.as_dict()).eval()
+    forces = chgnet([graph], task="ef")["f"][0]
+    (forces**2).sum().backward()
+    assert chgnet.atom_embedding.embedding.weight.grad.abs().sum() > 0
+
+    # energy-only predictions run without autograd
+    prediction = model.predict_tensors(graph, task="e")
+    assert prediction["e"].is_inference()
+    assert not model.predict_tensors(graph, task="ef")["f"].is_inference()
+
+
+def test_recompute_messages_matches_gradients():
+    recompute_model = CHGNet.from_dict(
+        {
+            **model.as_dict(),
+            "model_args": {**model.model_args, "recompute_messages": True},
+        }
+    )
+    assert all(layer.recompute_messages for layer in recompute_model.atom_conv_layers)
+
+    grads = []
+    for chgnet in (model, recompute_model):
+        chgnet.train()
+        chgnet.zero_grad()
+        prediction = chgnet([graph], task="efs")
+        loss = prediction["e"].sum() + prediction["f"][0].square().sum()
+        loss.backward()
+        grads.append([param.grad for param in chgnet.parameters()])
+        chgnet.eval()
+    for grad, recompute_grad in zip(*grads):
+        assert (grad is None) == (recompute_grad is None)
+        if grad is not None:
+            assert recompute_grad.numpy() == pytest.approx(grad.numpy(), abs=1e-6)
+
+
+def test_predict_batched_graphs_of_different_sizes() -> None:
+    perturbed = structure.copy()
+    perturbed.perturb(0.1)
+    graphs = [
+        graph,
+        model.graph_converter(structure * [2, 1, 1]),
+        model.graph_converter(perturbed),
+    ]
+    batched = model.predict_graph(graphs, task="efsm", batch_size=len(graphs))
+    for crystal_graph, preds in zip(graphs, batched):
+        single = model.predict_graph(crystal_graph, task="efsm")
+        for key in "efsm":
+            assert preds[key] == pytest.approx(single[key], abs=1e-5)
+
+
+def test_predict_graph_segment_csr(monkeypatch: pytest.MonkeyPatch) -> None:
+    # torch_scatter is optional, check the segment path against an index_add_
+    # reference of segment_csr so it runs without it too
+    calls = []
+
+    def segment_csr(src, indptr, reduce="sum"):
+        assert reduce == "sum"
+        calls.append(1)
+        segments = torch.arange(len(indptr) - 1, device=src.device)
+        owners = segments.repeat_interleave(indptr.diff())
+        output = src.new_zeros(len(indptr) - 1, *src.shape[1:])
+        return output.index_add_(0, owners, src)
+
+    graphs = [graph, model.graph_converter(structure * [2, 1, 1])]
+    monkeypatch.setattr(functions, "segment_csr", None)
+    single = model.predict_graph(graphs[0], task="efsm")
+    batched = model.predict_graph(graphs, task="efsm", batch_size=len(graphs))
+
+    monkeypatch.setattr(functions, "segment_csr", segment_csr)
+    single_segment = model.predict_graph(graphs[0], task="efsm")
+    assert len(calls) == 2 * model.n_conv - 1
+    batched_segment = model.predict_graph(graphs, task="efsm", batch_size=len(graphs))
+    for preds, expected in zip([single_segment, *batched_segment], [single, *batched]):
+        for key in "efsm":
+            assert preds[key] == pytest.approx(expected[key], abs=1e-5)
+
+
+@mark.skipif(not torch.cuda.is_available(), reason="No CUDA device")
+def test_predict_graph_pinned_staging() -> None:
+    cuda_model = CHGNet.from_dict(model.as_dict()).to("cuda")
+    graphs = [graph, model.graph_converter(structure * [2, 1, 1])]
+    staged = cuda_model.predict_graph(graphs, task="efsm", batch_size=len(graphs))
+    buffers = dict(cuda_model._pinned_staging.buffers)
+    assert all(buffer.is_pinned() for buffer in buffers.values())
+
+    # a batch that fits into the buffers reuses them
+    cuda_model.predict_graph(graphs[::-1], task="efsm", batch_size=len(graphs))
+    for field, buffer in buffers.items():
+        assert cuda_model._pinned_staging.buffers[field] is buffer
+
+    expected = model.predict_graph(graphs, task="efsm", batch_size=len(graphs))
+    for preds, expected_preds in zip(staged, expected):
+        for key in "efsm":
+            assert preds[key] == pytest.approx(expected_preds[key], abs=1e-4)
+
+
+@mark.parametrize("average", [True, False])
+def test_graph_pooling_segment_reduce(average: bool) -> None:
+    atom_feas = torch.randn(9, 4)
+    atoms_per_graph = torch.tensor([2, 4, 3])
+    atom_owners = torch.arange(3).repeat_interleave(atoms_per_graph)
+    pooling = GraphPooling(average=average).eval()
+    expected = pooling(atom_feas, atom_owners)
+    pooled = pooling(atom_feas, atom_owners, atoms_per_graph=atoms_per_graph)
+    assert torch.allclose(pooled, expected, atol=1e-6)
+
+
+@mark.parametrize("n_graphs", [1, 2])
+def test_batched_graph_without_angles(n_graphs: int) -> None:
+    converter = CrystalGraphConverter(atom_graph_cutoff=5, bond_graph_cutoff=0.5)
+    crystal_graph = converter(structure)
+    batched_graph = BatchedGraph.from_graphs(
+        [crystal_graph] * n_graphs,
+        bond_basis_expansion=model.bond_basis_expansion,
+        angle_basis_expansion=model.angle_basis_expansion,
+    )
+    assert batched_graph.angle_bases.shape == (0, model.model_args["num_angular"])
+    assert batched_graph.angle_bases.dtype == batched_graph.bond_bases_ag.dtype
+    assert batched_graph.batched_bond_graph.shape == (0, 3)
+    assert batched_graph.batched_bond_graph.dtype == crystal_graph.bond_graph.dtype
+
+
+@mark.parametrize("n_graphs", [1, 2])
+def test_batched_graph_basis_dtype(n_graphs: int) -> None:
+    batched_graph = BatchedGraph.from_graphs(
+        [graph] * n_graphs,
+        bond_basis_expansion=model.bond_basis_expansion,
+        angle_basis_expansion=model.angle_basis_expansion,
+        compute_stress=True,
+        basis_dtype=torch.bfloat16,
+    )
+    for bases in ("bond_bases_ag", "bond_bases_bg", "angle_bases"):
+        assert getattr(batched_graph, bases).dtype == torch.bfloat16
+    assert batched_graph.atom_positions.dtype == torch.float32
+    assert batched_graph.strains.dtype == torch.float32
+
+
+def test_scripted_encoders() -> None:
+    scripted_model = CHGNet.from_dict(
+        {**model.as_dict(), "model_args": {**model.model_args, "scripted": True}}
+    )
+    assert isinstance(scripted_model.bond_basis_expansion, torch.jit.ScriptModule)
+    scripted = scripted_model.predict_graph(graph, task="efsm")
+    expected = model.predict_graph(graph, task="efsm")
+    for key in "efsm":
+        assert scripted[key] == pytest.approx(expected[key], abs=1e-5)
+
+
+def test_compile_forward() -> None:
+    compiled_model = CHGNet.from_dict(model.as_dict())
+    compiled_model.compile_forward(mode=None)
+    assert "_compute_energy" in vars(compiled_model)
+    for struct in (structure, structure * [2, 1, 1]):
+        compiled = compiled_model.predict_structure(struct, task="efsm")
+        expected = model.predict_structure(struct, task="efsm")
+        for key in "efsm":
+            assert compiled[key] == pytest.approx(expected[key], abs=1e-4)
+
+
+def test_compile_forward_copy() -> None:
+    compiled_model = CHGNet.from_dict(model.as_dict())
+    compiled_model.compile_forward(mode=None)
+    copied_models = (
+        copy.deepcopy(compiled_model),
+        pickle.loads(pickle.dumps(compiled_model)),
+    )
+    expected = model.predict_graph(graph, task="efsm")
+    for copied_model in copied_models:
+        assert "_compute_energy" not in vars(copied_model)
+        assert copied_model.state_dict().keys() == model.state_dict().keys()
+        prediction = copied_model.predict_graph(graph, task="efsm")
+        for key in "efsm":
+            assert prediction[key] == pytest.approx(expected[key], abs=1e-5)
+    assert "_compute_energy" in vars(compiled_model)
+
+
+def test_compile_forward_bases() -> None:
+    compiled_model = CHGNet.from_dict(model.as_dict())
+    compiled_model.compile_forward(mode=None, compile_bases=True)
+    compiled = compiled_model.predict_structure(structure, task="efsm")
+    expected = model.predict_structure(structure, task="efsm")
+    for key in "efm":
+        assert compiled[key] == pytest.approx(expected[key], abs=1e-4)
+    # the stress sums many bond contributions and is the most sensitive to rounding
+    assert compiled["s"] == pytest.approx(expected["s"], abs=2e-3)
+
+
+def test_predict_graph_bf16_precision() -> None:
+    prediction = model.predict_graph(graph, task="efsm", precision="bf16")
+    expected = model.predict_graph(graph, task="efsm")
+    for key in "efsm":
+        assert prediction[key].dtype == np.float32
+    assert prediction["e"] == pytest.approx(expected["e"], abs=0.01)
+    assert prediction["f"] == pytest.approx(expected["f"], abs=0.1)
+
+    with pytest.raises(ValueError, match="precision='fp8' must be one of"):
+        model.predict_graph(graph, precision="fp8")
+
+
+def test_bond_ag_weight_cache() -> None:
+    chgnet = CHGNet.from_dict(model.as_dict())
+    energy = chgnet.predict_graph(graph, task="e")["e"]
+    assert chgnet.predict_graph(graph, task="ef")["e"] == pytest.approx(energy)
+    with torch.no_grad():
+        cached_weight = chgnet._bond_ag_weight()
+        assert cached_weight is chgnet._bond_ag_weight()
+    assert not cached_weight.is_inference()
+
+    # in-place weight updates invalidate the cached stack
+    with torch.no_grad():
+        chgnet.bond_embedding.weight.mul_(2)
+        assert chgnet._bond_ag_weight() is not cached_weight
+    assert chgnet.predict_graph(graph, task="e")["e"] != pytest.approx(energy)
+
+    # under autocast the stack is cached in the autocast dtype
+    with torch.no_grad():
+        with torch.autocast("cpu", dtype=torch.bfloat16):
+            assert chgnet._bond_ag_weight().dtype == torch.bfloat16
+        assert chgnet._bond_ag_weight().dtype == torch.float32
+
+    # frozen weights are cached even with grad enabled, e.g. for forces
+    chgnet.bond_embedding.requires_grad_(False)
+    chgnet.bond_weights_ag.requires_grad_(False)
+    cached_weight = chgnet._bond_ag_weight()
+    assert cached_weight is chgnet._bond_ag_weight()
+
+
+def test_bond_ag_weight_eval_backward() -> None:
+    # eval mode only changes norm and dropout, the weights still get gradients
+    chgnet = CHGNet.from_dict(model.as_dict()).eval()
+    chgnet([graph], task="e")["e"].sum().backward()
+    assert chgnet.bond_embedding.weight.grad is not None
+    assert chgnet.bond_weights_ag.weight.grad is not None
+    assert chgnet._bond_ag_weight_cache is None
+
+
+def test_predict_structure_batches_keep_order() -> None:
+    structs = [structure * [n_cells, 1, 1] for n_cells in (1, 2, 1, 3, 2)]
+    out = model.predict_structure(structs, task="ef", batch_size=2)
+    assert len(out) == len(structs)
+    for struct, preds in zip(structs, out):
+        assert preds["f"].shape == (len(struct), 3)
+        expected = model.predict_structure(struct, task="e")["e"]
+        assert preds["e"] == pytest.approx(expected, abs=1e-5)
+
+
+def test_model_init_is_silent_by_default(capsys: pytest.CaptureFixture[str]) -> None:
+    CHGNet(n_conv=1)
+    assert capsys.readouterr().out == ""
@@ -1,16 +1,21 @@
 from __future__ import annotations
 
+import pickle
 import re
 from typing import Literal
 
+import numpy as np
 import pytest
 import torch
+from ase.optimize import BFGS, FIRE
 from pymatgen.core import Structure
+from pymatgen.io.ase import AseAtomsAdaptor
 from pytest import approx, mark, param
 
 from chgnet import ROOT
 from chgnet.graph import CrystalGraphConverter
 from chgnet.model import CHGNet, StructOptimizer
+from chgnet.model.dynamics import JitBFGS, JitFIRE, TrajectoryObserver
 
 structure = Structure.from_file(f"{ROOT}/examples/mp-18767-LiMnO2.cif")
 
@@ -25,15 +30,22 @@ def test_relaxation(algorithm: Literal["legacy", "fast"]):
 
     chgnet.graph_converter = converter
     relaxer = StructOptimizer(model=chgnet)
-    result = relaxer.relax(structure, verbose=True)
+    result = relaxer.relax(
+        structure,
+        verbose=True,
+        track=("energy", "forces", "stress", "magmoms", "positions", "cell"),
+    )
     assert list(result) == ["final_structure", "trajectory"]
+    final_structure = result["final_structure"]
+    assert final_structure.species == structure.species
+    assert list(final_structure.site_properties) == ["magmom"]
 
     traj = result["trajectory"]
     # make sure trajectory has expected attributes
-    assert {*traj.__dict__} == {
-        *"atoms energies forces stresses magmoms atom_positions cells".split()
-    }
-    assert len(traj) == 4
+    for key in ("energies", "forces", "stresses", "magmoms", "atom_positions", "cells"):
+        assert len(getattr(traj, key)) == len(traj)
+    assert traj.forces.shape == (3, len(structure), 3)
+    assert len(traj) == 3
 
     # make sure final structure is more relaxed than initial one
     assert traj.energies[0] > traj.energies[-1]
@@ -50,3 +62,108 @@ no_mps = mark.skipif(not torch.backends.mps.is_available(), reason="No MPS devic
 def test_structure_optimizer_passes_kwargs_to_model(use_device) -> None:
     relaxer = StructOptimizer(use_device=use_device)
     assert re.match(rf"{use_device}(:\d+)?", relaxer.calculator.device)
+
+
+def test_relax_many_matches_relax():
+    relaxer = StructOptimizer()
+    structures = []
+    for stdev in (0.1, 0.15):
+        perturbed = structure.copy()
+        perturbed.perturb(stdev)
+        structures.append(perturbed)
+    structures.append(structure * [2, 1, 1])
+
+    results = relaxer.relax_many(structures, fmax=0.05, steps=100, batch_size=2)
+    assert len(results) == len(structures)
+    for struct, result in zip(structures, results):
+        ref = relaxer.relax(
+            struct, fmax=0.05, steps=100, relax_cell=False, verbose=False
+        )
+        assert result["converged"]
+        assert result["energy"] == approx(ref["trajectory"].energies[-1], abs=1e-4)
+        assert result["final_structure"].lattice == struct.lattice
+        assert "magmom" in result["final_structure"].site_properties
+        assert abs(result["forces"]).max() < 0.05
+
+
+def test_trajectory_observer_buffers(tmp_path):
+    atoms = AseAtomsAdaptor.get_atoms(structure)
+    atoms.calc = StructOptimizer().calculator
+    obs = TrajectoryObserver(
+        atoms,
+        keys=("energy", "forces", "positions"),
+        max_steps=2,
+        save_interval=2,
+        memmap_threshold=50,
+    )
+    for _ in range(7):
+        atoms.rattle(stdev=0.01)
+        obs()
+
+    # calls 1, 3, 5 and 7 are recorded, growing the buffers beyond max_steps
+    assert len(obs) == 4
+    assert isinstance(obs._buffers["forces"], np.memmap)
+    assert obs.atom_positions[-1] == approx(atoms.get_positions())
+    assert obs.energies[-1] == approx(atoms.get_potential_energy())
+
+    obs.save(f"{tmp_path}/traj.pkl")
+    with open(f"{tmp_path}/traj.pkl", "rb") as file:
+        saved = pickle.load(file)
+    assert saved["forces"].shape == (4, len(atoms), 3)
+    assert len(saved["stresses"]) == 0
+
+
+def test_relax_tracks_energy_by_default():
+    result = StructOptimizer().relax(structure, verbose=False)
+    traj = result["trajectory"]
+    assert traj.keys == ("energy",)
+    assert len(traj.energies) == len(traj) > 0
+    assert len(traj.forces) == 0
+
+    with pytest.raises(ValueError, match=r"unknown_keys=\{'forcez'\}"):
+        TrajectoryObserver(traj.atoms, keys=("energy", "forcez"))
+
+
+@mark.parametrize(("jit_optimizer", "optimizer"), [(JitFIRE, FIRE), (JitBFGS, BFGS)])
+def test_jit_optimizer_matches_ase(jit_optimizer, optimizer):
+    perturbed = structure.copy()
+    perturbed.perturb(0.1)
+    calculator = StructOptimizer().calculator
+    results = []
+    for optimizer_class in (jit_optimizer, optimizer):
+        relaxer = StructOptimizer(model=calculator, optimizer_class=optimizer_class)
+        result = relaxer.relax(perturbed, steps=20, verbose=False)
+        results.append(result["final_structure"])
+    assert results[0].cart_coords == approx(results[1].cart_coords, abs=1e-6)
+    assert results[0].lattice.matrix == approx(results[1].lattice.matrix, abs=1e-6)
+
+
+def test_relax_iter():
+    relaxer = StructOptimizer()
+    structures = (structure * supercell for supercell in ([1, 1, 1], [2, 1, 1]))
+    results = relaxer.relax_iter(structures, steps=5, relax_cell=False, verbose=False)
+    for supercell, result in zip(([1, 1, 1], [2, 1, 1]), results):
+        ref = relaxer.relax(
+            structure * supercell, steps=5, relax_cell=False, verbose=False
+        )
+        assert result["trajectory"].energies == approx(ref["trajectory"].energies)
+        assert result["final_structure"] == ref["final_structure"]
+
+
+def test_trajectory_observer_reads_results_once(monkeypatch):
+    atoms = AseAtomsAdaptor.get_atoms(structure)
+    atoms.calc = StructOptimizer().calculator
+    atoms.get_stress()
+    obs = TrajectoryObserver(atoms, keys=("energy", "forces", "stress", "magmoms"))
+
+    n_checks = []
+    check_state = atoms.calc.check_state
+    monkeypatch.setattr(
+        atoms.calc,
+        "check_state",
+        lambda *args, **kwargs: n_checks.append(1) or check_state(*args, **kwargs),
+    )
+    obs()
+    assert len(n_checks) == 1
+    assert obs.energies[0] == atoms.calc.results["energy"]
+    assert obs.compute_energy() == atoms.calc.results["energy"]